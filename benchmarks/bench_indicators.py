@@ -0,0 +1,145 @@
+# Benchmark: vectorized indicator engine (indicators.py) vs the original
+# groupby/transform chain from stock_feature_engineering.py.
+#
+# Run from the repo root:
+#   python -m benchmarks.bench_indicators                  # synthetic panel
+#   python -m benchmarks.bench_indicators all_stocks_5yr.csv
+#
+# Both versions are run on the same frame, the outputs are compared column by
+# column, then the timings and speedup are printed.
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_COLUMNS, compute_indicators
+
+
+def legacy_indicators(df):
+    """The original stock_feature_engineering.py body, kept here as the baseline."""
+    df = df.copy()
+    grouped = df.groupby('Name', group_keys=False)
+    df['daily_variation'] = (df['high'] - df['low']) / df['open']
+    df['daily_return'] = grouped['close'].transform(lambda x: x.pct_change())
+    df['sma_7'] = grouped['close'].transform(lambda x: x.rolling(window=5).mean())
+    df['std_7'] = grouped['close'].transform(lambda x: x.rolling(window=5).std())
+    df['ema_14'] = grouped['close'].transform(lambda x: x.ewm(span=10, adjust=False).mean())
+    ema12_ret = grouped['daily_return'].transform(lambda x: x.ewm(span=12, adjust=False).mean())
+    ema26_ret = grouped['daily_return'].transform(lambda x: x.ewm(span=26, adjust=False).mean())
+    df['macd'] = ema12_ret - ema26_ret
+    # signal line grouped by ticker since the incremental mode (was df['macd'].ewm(...) over all rows)
+    df['macd_signal'] = df.groupby('Name')['macd'].transform(lambda x: x.ewm(span=9, adjust=False).mean())
+    df['cumulative_return'] = df.groupby('Name').apply(lambda g: ((g['close'] - g['close'].iloc[0]) / g['close'].iloc[0]) * 100).reset_index(level=0, drop=True)
+    df['gain'] = df['daily_return'].apply(lambda x: x if x > 0 else 0)
+    df['loss'] = df['daily_return'].apply(lambda x: -x if x < 0 else 0)
+    avg_gain = df.groupby('Name')['gain'].rolling(window=14, min_periods=1).mean().reset_index(level=0, drop=True)
+    avg_loss = df.groupby('Name')['loss'].rolling(window=14, min_periods=1).mean().reset_index(level=0, drop=True)
+    rs = avg_gain / avg_loss
+    df['rsi'] = 100 - (100 / (1 + rs))
+    df['L14'] = df.groupby('Name')['low'].rolling(window=14, min_periods=1).min().reset_index(level=0, drop=True)
+    df['H14'] = df.groupby('Name')['high'].rolling(window=14, min_periods=1).max().reset_index(level=0, drop=True)
+    df['stochastic_oscillator'] = ((df['close'] - df['L14']) / (df['H14'] - df['L14'])) * 100
+    df['prev_high'] = df.groupby('Name')['high'].shift(1)
+    df['prev_low'] = df.groupby('Name')['low'].shift(1)
+    df['prev_close'] = df.groupby('Name')['close'].shift(1)
+    tr1 = df['high'] - df['low']
+    tr2 = np.abs(df['high'] - df['prev_close'])
+    tr3 = np.abs(df['low'] - df['prev_close'])
+    df['true_range'] = np.maximum.reduce([tr1, tr2, tr3])
+    df['atr'] = df.groupby('Name')['true_range'].transform(lambda x: x.ewm(alpha=1/14, adjust=False).mean())
+    df['plus_dir'] = df['high'] - df['prev_high']
+    df['minus_dir'] = df['prev_low'] - df['low']
+    df['plus_dm'] = np.where((df['plus_dir'] > df['minus_dir']) & (df['plus_dir'] > 0), df['plus_dir'], 0)
+    df['minus_dm'] = np.where((df['minus_dir'] > df['plus_dir']) & (df['minus_dir'] > 0), df['minus_dir'], 0)
+    df['smoothed_plus_dm'] = df.groupby('Name')['plus_dm'].transform(lambda x: x.ewm(span=14, adjust=False).mean())
+    df['smoothed_minus_dm'] = df.groupby('Name')['minus_dm'].transform(lambda x: x.ewm(span=14, adjust=False).mean())
+    df['smoothed_plus_dm'] = (df['smoothed_plus_dm'] / df['atr']) * 100
+    df['smoothed_minus_dm'] = (df['smoothed_minus_dm'] / df['atr']) * 100
+    df['dx'] = (np.abs(df['smoothed_plus_dm'] - df['smoothed_minus_dm']) / np.abs((df['smoothed_plus_dm'] + df['smoothed_minus_dm']))) * 100
+    df['adx'] = df.groupby('Name')['dx'].transform(lambda x: x.ewm(span=14, adjust=False).mean())
+    df['future_price_3'] = df.groupby('Name')['close'].shift(periods=-3)
+    df['future_price_7'] = df.groupby('Name')['close'].shift(periods=-5)
+    future_return_3 = df.groupby('Name')['close'].transform(lambda x: x.shift(-3) / x - 1)
+    future_return_7 = df.groupby('Name')['close'].transform(lambda x: x.shift(-5) / x - 1)
+
+    def create_label(return_value):
+        if return_value > 0.03:
+            return 'buy'
+        elif return_value < -0.03:
+            return 'sell'
+        else:
+            return 'hold'
+
+    df['label_3'] = future_return_3.apply(create_label)
+    df['label_7'] = future_return_7.apply(create_label)
+    return df
+
+
+def synthetic_panel(n_stocks=500, n_days=1259, seed=175):
+    """Random-walk OHLCV panel shaped like all_stocks_5yr.csv (sorted by Name, date)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2013-02-08', periods=n_days)
+    names = [f'S{i:04d}' for i in range(n_stocks)]
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, (n_stocks, n_days)), axis=1))
+    open_ = close * np.exp(rng.normal(0, 0.005, close.shape))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, close.shape))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, close.shape))
+    volume = rng.integers(100_000, 10_000_000, close.shape)
+    return pd.DataFrame({
+        'date': np.tile(dates, n_stocks),
+        'open': open_.ravel().round(2),
+        'high': high.ravel().round(2),
+        'low': low.ravel().round(2),
+        'close': close.ravel().round(2),
+        'volume': volume.ravel(),
+        'Name': np.repeat(names, n_days),
+    })
+
+
+def compare(expected, actual):
+    """Largest relative difference per numeric column; labels must match exactly."""
+    worst = {}
+    for col in INDICATOR_COLUMNS:
+        a = expected[col].to_numpy()
+        b = actual[col].to_numpy()
+        if col.startswith('label_'):
+            if not np.array_equal(a.astype(str), b.astype(str)):
+                raise AssertionError(f'{col} differs')
+            continue
+        a = a.astype(np.float64)
+        b = b.astype(np.float64)
+        if not np.array_equal(np.isnan(a), np.isnan(b)):
+            raise AssertionError(f'{col} has NaNs in different rows')
+        ok = ~np.isnan(a) & np.isfinite(a)
+        scale = np.maximum(np.abs(a[ok]), 1.0)
+        worst[col] = float(np.max(np.abs(a[ok] - b[ok]) / scale)) if ok.any() else 0.0
+    return worst
+
+
+def main():
+    if len(sys.argv) > 1:
+        df = pd.read_csv(sys.argv[1], parse_dates=['date'])
+        df = df.sort_values(['Name', 'date'], kind='stable').reset_index(drop=True)
+    else:
+        df = synthetic_panel()
+    print(f'Panel: {len(df)} rows, {df["Name"].nunique()} tickers')
+
+    t0 = time.perf_counter()
+    expected = legacy_indicators(df)
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    actual = compute_indicators(df)
+    t_new = time.perf_counter() - t0
+
+    worst = compare(expected, actual)
+    print(f'max relative difference: {max(worst.values()):.2e} ({max(worst, key=worst.get)})')
+    print(f'legacy groupby chain : {t_legacy:8.3f} s')
+    print(f'vectorized engine    : {t_new:8.3f} s')
+    print(f'speedup              : {t_legacy / t_new:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Benchmark: the rolling-window / EWM kernels (kernels.py) against pandas and the
+# lagged-copy / per-day-loop paths of indicators.py.
+#
+# Run from the repo root:
+#   python -m benchmarks.bench_kernels                     # synthetic panel + 23k-row series
+#   python -m benchmarks.bench_kernels --long SPX.csv      # the index closes as the long series
+#
+# Timings only, on a ragged panel (tickers of 1 to 1259 rows) with NaN gaps and on
+# one long series. The equivalence with pandas is checked by tests/test_kernels.py.
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import kernels
+from indicators import ewm_alpha, group_offsets
+
+WINDOWS = [5, 14, 60, 250]
+EWM_SPANS = [10, 12, 26]
+
+
+def ragged_panel(n_stocks=500, max_days=1259, seed=175):
+    """Prices of tickers of random length with NaN gaps and flat stretches."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, max_days + 1, n_stocks)
+    lengths[:2] = [1, max_days]
+    pos = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    values = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, len(pos))))
+    values = values.round(2)
+    values[rng.random(len(pos)) < 0.05] = np.nan
+    values[(pos % 97) < 12] = 25.0
+    return np.repeat(np.arange(n_stocks), lengths), values
+
+
+def long_series(path=None, n_days=23_323, seed=175):
+    """Close of an index CSV, or a random walk as long as SPX.csv (1927 onwards)."""
+    if path is not None:
+        return pd.read_csv(path, usecols=['Close'])['Close'].to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    return (17.66 * np.exp(np.cumsum(rng.normal(0.0002, 0.012, n_days)))).round(2)
+
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - t0
+
+
+def _lagged(func):
+    # indicators' lagged-copy version at any window (it hands long windows to kernels.py)
+    def run(values, pos, window, min_periods):
+        limit, indicators.LAGGED_MAX_WINDOW = indicators.LAGGED_MAX_WINDOW, window
+        try:
+            return getattr(indicators, f'rolling_{func}')(values, pos, window, min_periods)
+        finally:
+            indicators.LAGGED_MAX_WINDOW = limit
+    return run
+
+
+def bench_rolling(group, values, label):
+    starts, lengths = group_offsets(group)
+    pos = np.arange(len(values)) - np.repeat(starts, lengths)
+    series = pd.Series(values)
+    for window in WINDOWS:
+        for func in ('min', 'max', 'mean', 'std'):
+            t_pandas = timed(lambda: getattr(series.groupby(group).rolling(window, min_periods=1), func)())
+            t_lagged = timed(_lagged(func), values, pos, window, 1)
+            t_kernel = timed(getattr(kernels, f'rolling_{func}'), values, pos, window, 1)
+            print(f'{label:6} {func:4} w={window:<4} pandas {t_pandas:7.3f} s   '
+                  f'lagged {t_lagged:7.3f} s   kernel {t_kernel:7.3f} s')
+
+
+def bench_ewm(group, values, label):
+    starts, lengths = group_offsets(group)
+    columns = np.column_stack([values * (1 + i) for i in range(len(EWM_SPANS))])
+    alphas = [ewm_alpha(span=s) for s in EWM_SPANS]
+    t_pandas = timed(lambda: [
+        pd.Series(columns[:, i]).groupby(group).transform(lambda x, s=s: x.ewm(span=s, adjust=False).mean())
+        for i, s in enumerate(EWM_SPANS)])
+    # the per-day loop, whatever the number of groups
+    limit, indicators.SCAN_MAX_GROUPS = indicators.SCAN_MAX_GROUPS, -1
+    try:
+        t_loop = timed(indicators.grouped_ewm, columns, alphas, starts, lengths)
+    finally:
+        indicators.SCAN_MAX_GROUPS = limit
+    t_scan = timed(kernels.segmented_ewm, columns, alphas, starts, lengths)
+    print(f'{label:6} ewm  spans={EWM_SPANS} pandas {t_pandas:7.3f} s   '
+          f'day loop {t_loop:7.3f} s   scan {t_scan:7.3f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rolling-window / EWM kernel timings.')
+    parser.add_argument('--long', help='index CSV whose Close column is the long series')
+    args = parser.parse_args()
+
+    group, values = ragged_panel()
+    series = long_series(args.long)
+    print(f'Panel: {len(values)} rows, {len(np.unique(group))} tickers; '
+          f'long series: {len(series)} rows')
+
+    for label, (g, v) in {'panel': (group, values),
+                          'long': (np.zeros(len(series), dtype=np.int64), series)}.items():
+        bench_rolling(g, v, label)
+        bench_ewm(g, v, label)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+# Benchmark suite for the pipeline hot paths, on seeded synthetic data that scales
+# with tickers x days.
+#
+# Run from the repo root:
+#   python -m benchmarks.bench_suite                                # 100 x 1259
+#   python -m benchmarks.bench_suite --tickers 100 500 --days 1259 --out bench.json
+#   python -m benchmarks.bench_suite --compare bench.json           # exit 1 on a regression
+#
+# Stages (each one is fed by the outputs of the ones before it, built untimed):
+#   indicators  compute_indicators on the raw OHLCV panel (stock_feature_engineering.py)
+#   news_join   headline timestamps -> trading dates, join to the price rows and the
+#               per stock-day sentiment totals (data_processing.py)
+#   label_merge attach nn3 / nn7 predictions to the selected rows (portfolio_combine_labels.py)
+#   backtest    every model x entry/exit strategy (portfolio.py)
+#   pnl_curves  per-stock realized P&L and the portfolio equity curve of every
+#               strategy (portfolio_graphs.py)
+#
+# Each stage is timed `repeat` times (min and median are kept) and then run once
+# more under tracemalloc for its peak allocation. Results are written as JSON, one
+# record per (stage, tickers, days), together with the library versions and commit.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'portfolio_code'))
+from indicators import compute_indicators
+from data_processing import SENTIMENT_MAP, add_daily, join_news, trading_dates
+from label_merge import LabelMerger
+from backtest import run_backtest
+from equity_curve import equity_curve, stock_realized_pnl
+
+from benchmarks.bench_indicators import synthetic_panel
+
+MODEL_COLUMNS = ['xg3', 'xg7', 'nn3', 'nn7']
+LABELS = np.array(['buy', 'hold', 'sell'], dtype=object)
+HEADLINE_WORDS = ['shares', 'beat', 'miss', 'upgrade', 'downgrade', 'guidance', 'record', 'falls', 'rally', 'lawsuit']
+
+
+def synthetic_news(panel, per_day=0.3, seed=175):
+    """Headlines for random (ticker, day) pairs of panel, in analyst_ratings / FinBERT layout.
+
+    About per_day headlines per ticker-day; timestamps carry a US/Eastern offset like
+    the source file, sentiment is a FinBERT label.
+    """
+    rng = np.random.default_rng(seed)
+    n = rng.poisson(per_day * len(panel))
+    rows = rng.integers(0, len(panel), n)
+    dates = pd.to_datetime(panel['date'].to_numpy()[rows]) + pd.to_timedelta(rng.integers(0, 8 * 3600, n) + 9 * 3600, unit='s')
+    words = rng.choice(HEADLINE_WORDS, (n, 4))
+    return pd.DataFrame({
+        'title': [' '.join(w) for w in words],
+        'date': dates.strftime('%Y-%m-%d %H:%M:%S') + '-04:00',
+        'stock': panel['Name'].to_numpy()[rows],
+        'sentiment': rng.choice(list(SENTIMENT_MAP), n),
+    })
+
+
+def synthetic_predictions(panel, columns, seed=175, keep=1.0):
+    """(stock, date) rows of panel with a random buy / hold / sell label per column.
+
+    keep < 1 drops rows at random, and the rows are shuffled, as a prediction file
+    written by another job would be.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.flatnonzero(rng.random(len(panel)) < keep)
+    rng.shuffle(rows)
+    frame = pd.DataFrame({'stock': panel['Name'].to_numpy()[rows], 'date': panel['date'].to_numpy()[rows]})
+    for col in columns:
+        frame[col] = LABELS[rng.integers(0, 3, len(rows))]
+    return frame
+
+
+def _stage_inputs(n_tickers, n_days, seed):
+    # every stage's inputs, built once per size and not timed
+    panel = synthetic_panel(n_tickers, n_days, seed)
+    features = compute_indicators(panel)
+    prices = features.rename(columns={'Name': 'stock'})
+    index = pd.MultiIndex.from_arrays([prices['stock'].astype(str), prices['date'].astype('datetime64[ns]')])
+    news = synthetic_news(panel, seed=seed)
+
+    # selected_data_completed.csv: price rows with the xg / log predictions as columns
+    rng = np.random.default_rng(seed)
+    selected = features[['date', 'open', 'close', 'Name']].rename(columns={'Name': 'stock'})
+    for col in ['xg3', 'xg7', 'log3', 'log7']:
+        selected[col] = LABELS[rng.integers(0, 3, len(selected))]
+    nn = synthetic_predictions(panel, ['nn3', 'nn7'], seed + 1, keep=0.98)
+
+    merger = LabelMerger(selected)
+    merger.attach(nn, ['nn3', 'nn7'])
+    merged = merger.frame()
+    trades, _ = run_backtest(merged, MODEL_COLUMNS)
+    return {'panel': panel, 'prices': prices, 'index': index, 'news': news, 'selected': selected,
+            'nn': nn, 'merged': merged, 'trades': trades}
+
+
+def _news_join(prices, index, news):
+    news = news.assign(sentiment=news['sentiment'].map(SENTIMENT_MAP), date=trading_dates(news['date']))
+    return join_news(prices, index, news), add_daily(None, news)
+
+
+def _label_merge(selected, nn):
+    merger = LabelMerger(selected)
+    merger.attach(nn, ['nn3', 'nn7'])
+    return merger.frame()
+
+
+def _pnl_curves(trades, prices):
+    prices = prices[['stock', 'date', 'close']]
+    for _, strategy_trades in trades.groupby('strategy', sort=False):
+        stock_realized_pnl(strategy_trades, prices)
+        equity_curve(strategy_trades, prices)
+
+
+STAGES = {
+    'indicators': (lambda d: (d['panel'],), compute_indicators, lambda d: len(d['panel'])),
+    'news_join': (lambda d: (d['prices'], d['index'], d['news']), _news_join, lambda d: len(d['news'])),
+    'label_merge': (lambda d: (d['selected'], d['nn']), _label_merge, lambda d: len(d['selected'])),
+    'backtest': (lambda d: (d['merged'], MODEL_COLUMNS), run_backtest, lambda d: len(d['merged'])),
+    'pnl_curves': (lambda d: (d['trades'], d['merged']), _pnl_curves, lambda d: len(d['merged'])),
+}
+
+
+def measure(fn, args, repeat=3):
+    """(list of wall times in seconds, peak traced allocation in bytes) of fn(*args)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def run_suite(sizes, stages=tuple(STAGES), repeat=3, seed=175):
+    """One result dict per (size, stage); sizes is a list of (tickers, days)."""
+    results = []
+    for n_tickers, n_days in sizes:
+        data = _stage_inputs(n_tickers, n_days, seed)
+        for stage in stages:
+            make_args, fn, count_rows = STAGES[stage]
+            times, peak = measure(fn, make_args(data), repeat)
+            rows = count_rows(data)
+            results.append({
+                'stage': stage,
+                'tickers': n_tickers,
+                'days': n_days,
+                'rows': rows,
+                'repeat': repeat,
+                'seconds_min': min(times),
+                'seconds_median': float(np.median(times)),
+                'rows_per_sec': rows / min(times) if min(times) > 0 else None,
+                'peak_mb': peak / 2**20,
+            })
+            print(f"{stage:12s} {n_tickers:5d} x {n_days:5d}  {min(times):8.3f} s  "
+                  f"{peak / 2**20:9.1f} MB peak  {rows / min(times):12,.0f} rows/s")
+    return results
+
+
+def environment():
+    """Versions and commit the numbers were taken with."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def compare(results, baseline, max_slowdown=0.20):
+    """Print time / memory ratios against a baseline run; returns the regressed records."""
+    old = {(r['stage'], r['tickers'], r['days']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        b = old.get((r['stage'], r['tickers'], r['days']))
+        if b is None:
+            continue
+        t_ratio = r['seconds_min'] / b['seconds_min'] if b['seconds_min'] else float('inf')
+        m_ratio = r['peak_mb'] / b['peak_mb'] if b['peak_mb'] else float('inf')
+        flag = t_ratio > 1 + max_slowdown or m_ratio > 1 + max_slowdown
+        if flag:
+            regressions.append(r)
+        print(f"{r['stage']:12s} {r['tickers']:5d} x {r['days']:5d}  time x{t_ratio:5.2f}  "
+              f"memory x{m_ratio:5.2f}{'  REGRESSION' if flag else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and memory benchmarks of the pipeline stages.')
+    parser.add_argument('--tickers', nargs='+', type=int, default=[100])
+    parser.add_argument('--days', nargs='+', type=int, default=[1259])
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=175)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', metavar='BASELINE_JSON', help='earlier --out file to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=0.20,
+                        help='allowed time / memory increase over the baseline (0.20 = 20%%)')
+    args = parser.parse_args()
+
+    sizes = [(t, d) for t in args.tickers for d in args.days]
+    results = run_suite(sizes, args.stages, args.repeat, args.seed)
+    report = {'environment': environment(), 'seed': args.seed, 'results': results}
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"→ Wrote {len(results)} results to '{args.out}'")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_slowdown):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
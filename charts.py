@@ -0,0 +1,113 @@
+# Shared chart helpers: batched candlestick drawing and a cached, parallel
+# renderer for the per-strategy / per-stock PNGs.
+#
+# render_charts takes a list of (output path, draw function, args) jobs. Each job
+# is keyed by a hash of its args and the draw function's source; jobs whose key
+# matches the one recorded in the cache manifest (and whose PNG still exists) are
+# skipped, the rest are drawn across a process pool with the Agg backend.
+
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib.collections import LineCollection, PolyCollection
+
+CACHE_FILE = '.render_cache.json'
+
+
+def draw_candles(ax, x, open_, high, low, close, width=0.6, up='green', down='red'):
+    """Candlesticks as two collections (wicks and bodies) instead of one artist per day."""
+    x, open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (x, open_, high, low, close))
+    colors = np.where(close >= open_, up, down)
+
+    wicks = np.stack([np.column_stack([x, low]), np.column_stack([x, high])], axis=1)
+    ax.add_collection(LineCollection(wicks, colors=colors, linewidths=1))
+
+    left, right = x - width / 2, x + width / 2
+    bottom, top = np.minimum(open_, close), np.maximum(open_, close)
+    bodies = np.stack([
+        np.column_stack([left, bottom]), np.column_stack([left, top]),
+        np.column_stack([right, top]), np.column_stack([right, bottom]),
+    ], axis=1)
+    ax.add_collection(PolyCollection(bodies, facecolors=colors, edgecolors=colors, linewidths=0.5))
+    ax.autoscale_view()
+
+
+def content_hash(*parts):
+    """Stable hash of arrays, frames and plain values (str, numbers, tuples of those)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            h.update(repr(list(getattr(part, 'columns', [part.name]))).encode())
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            if part.dtype == object:
+                h.update(pd.util.hash_array(part).tobytes())
+            else:
+                h.update(f'{part.dtype.str}{part.shape}'.encode())
+                h.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, (tuple, list)):
+            h.update(content_hash(*part).encode())
+        else:
+            h.update(repr(part).encode())
+        h.update(b'|')
+    return h.hexdigest()
+
+
+def _use_agg():
+    matplotlib.use('Agg')
+
+
+def _render(path, draw, args):
+    draw(path, *args)
+    return path
+
+
+def render_charts(jobs, cache_dir, max_workers=None):
+    """Draw every job whose inputs changed since the last run.
+
+    Args:
+        jobs (list): (png path, draw function, args) tuples; draw(path, *args) must save
+            the figure to path. draw has to be a module-level function (it is pickled).
+        cache_dir (str): directory holding the CACHE_FILE manifest.
+        max_workers (int): worker processes; None uses os.cpu_count().
+
+    Returns:
+        (int, int): number of charts rendered and skipped.
+    """
+    manifest_path = os.path.join(cache_dir, CACHE_FILE)
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    sources = {}
+    todo = []
+    for path, draw, args in jobs:
+        if draw not in sources:
+            sources[draw] = inspect.getsource(draw)
+        key = content_hash(sources[draw], args)
+        if manifest.get(path) == key and os.path.isfile(path):
+            continue
+        todo.append((path, draw, args, key))
+
+    try:
+        if todo:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_use_agg) as pool:
+                futures = {pool.submit(_render, path, draw, args): (path, key) for path, draw, args, key in todo}
+                for future in as_completed(futures):
+                    path, key = futures[future]
+                    future.result()
+                    manifest[path] = key
+    finally:
+        # keep whatever finished, even if a chart failed
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=0, sort_keys=True)
+
+    return len(todo), len(jobs) - len(todo)
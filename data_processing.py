@@ -1,2 +1,156 @@
+# Builds the news + price training data (what data_processing.ipynb does) without
+# holding the news file in memory.
+#
+# finBert_sentiment.csv is read in chunks. Every chunk gets its timestamps turned
+# into trading dates (the UTC calendar date, as in the notebook), is looked up in a
+# (stock, date) index over the indicator table and appended to combined_data.csv:
+# one row per headline with the price / indicator columns of that stock-day, same
+# as the notebook's merge + title.notna() filter. Per (stock, date) sentiment sums
+# and counts are accumulated on the side, so memory is bounded by the number of
+# stock-days, not by the number of headlines, and written to daily_sentiment.csv.
+#
+# Usage:
+#   python data_processing.py             # combined_data.csv + daily_sentiment.csv
+#   python data_processing.py --split     # also training/validation/testing_data.csv
+
+import argparse
+import os
+
 import numpy as np
 import pandas as pd
+
+from indicators import INDICATOR_COLUMNS, restore_intermediates
+from instrument import span
+from storage import read_table
+
+NEWS_FILE = 'finBert_sentiment.csv'
+PRICE_PATH = 'stocks_with_indicators.parquet'
+COMBINED_FILE = 'combined_data.csv'
+DAILY_FILE = 'daily_sentiment.csv'
+CHUNK_ROWS = 100_000
+
+SENTIMENT_MAP = {'negative': -1, 'neutral': 0, 'positive': 1}
+NEWS_COLUMNS = ['title', 'date', 'stock', 'sentiment']
+# columns of the indicator table that the labeled file used for training did not have
+DROP_COLUMNS = ['true_range', 'plus_dir', 'minus_dir', 'plus_dm', 'minus_dm', 'future_price_3', 'future_price_7']
+
+
+def trading_dates(timestamps):
+    """News timestamps -> the date they are joined on (UTC calendar date, tz-naive)."""
+    ts = pd.to_datetime(timestamps, errors='coerce', utc=True)
+    return ts.dt.tz_localize(None).dt.normalize().astype('datetime64[ns]')
+
+
+def read_news(path=NEWS_FILE, chunk_rows=CHUNK_ROWS):
+    """Yield the scored headlines chunk by chunk with mapped sentiment and trading dates."""
+    for chunk in pd.read_csv(path, usecols=NEWS_COLUMNS, chunksize=chunk_rows):
+        chunk['sentiment'] = chunk['sentiment'].map(SENTIMENT_MAP)
+        chunk['date'] = trading_dates(chunk['date'])
+        yield chunk.dropna(subset=['date'])
+
+
+def load_prices(path=PRICE_PATH):
+    """Indicator table in the training-data column order, plus its (stock, date) index."""
+    # a compact table (stock_feature_engineering.py --compact) has no intermediates
+    prices = restore_intermediates(read_table(path)).rename(columns={'Name': 'stock'})
+    prices['stock'] = prices['stock'].astype(str)
+    prices['date'] = prices['date'].astype('datetime64[ns]')
+    front = ['date', 'open', 'high', 'low', 'close', 'volume', 'stock']
+    rest = [c for c in INDICATOR_COLUMNS if c in prices.columns and c not in DROP_COLUMNS]
+    prices = prices[front + rest]
+
+    index = pd.MultiIndex.from_arrays([prices['stock'], prices['date']])
+    if not index.is_unique:
+        raise ValueError(f"'{path}' has more than one row per (stock, date)")
+    return prices, index
+
+
+def join_news(prices, index, news):
+    """Price rows for every headline whose (stock, date) is in the price table."""
+    pos = index.get_indexer(pd.MultiIndex.from_arrays([news['stock'].astype(str), news['date']]))
+    found = pos >= 0
+    joined = prices.iloc[pos[found]].reset_index(drop=True)
+    joined['title'] = news['title'].to_numpy()[found]
+    joined['sentiment'] = news['sentiment'].to_numpy()[found]
+    return joined[joined['title'].notna()]
+
+
+def add_daily(totals, news):
+    """Fold one chunk into the running per (stock, date) sentiment sum / count."""
+    part = news.groupby(['stock', 'date'])['sentiment'].agg(['sum', 'count'])
+    return part if totals is None else totals.add(part, fill_value=0)
+
+
+def build_combined(news_path=NEWS_FILE, price_path=PRICE_PATH, out_path=COMBINED_FILE,
+                   daily_path=DAILY_FILE, chunk_rows=CHUNK_ROWS):
+    """Stream the news file into the per-headline and per-stock-day outputs.
+
+    Returns:
+        (int, int): rows written to out_path and to daily_path.
+    """
+    with span('load_prices') as s:
+        prices, index = load_prices(price_path)
+        s.rows = len(prices)
+
+    n_rows = 0
+    totals = None
+    header = True
+    with span('news_join') as s:
+        s.rows = 0
+        for news in read_news(news_path, chunk_rows):
+            joined = join_news(prices, index, news)
+            joined.to_csv(out_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            n_rows += len(joined)
+            s.rows += len(news)
+            totals = add_daily(totals, news)
+
+    if header:  # empty news file: still leave a file with the right columns
+        pd.DataFrame(columns=list(prices.columns) + ['title', 'sentiment']).to_csv(out_path, index=False)
+
+    with span('daily_sentiment') as s:
+        daily = pd.DataFrame(columns=['sentiment_avg', 'n_headlines'])
+        if totals is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                daily = pd.DataFrame({
+                    'sentiment_avg': totals['sum'] / totals['count'],
+                    'n_headlines': totals['count'].astype(np.int64),
+                })
+        pos = index.get_indexer(daily.index) if len(daily) else np.zeros(0, dtype=np.int64)
+        found = pos >= 0
+        daily_rows = prices.iloc[pos[found]].reset_index(drop=True)
+        daily_rows['sentiment_avg'] = daily['sentiment_avg'].to_numpy()[found]
+        daily_rows['n_headlines'] = daily['n_headlines'].to_numpy()[found]
+        daily_rows = daily_rows.sort_values(['stock', 'date'], kind='stable')
+        daily_rows.to_csv(daily_path, index=False)
+        s.rows = len(daily_rows)
+    return n_rows, len(daily_rows)
+
+
+def split_dataset(path=COMBINED_FILE):
+    """70 / 15 / 15 random split of the combined data, as in the notebook."""
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(path)
+    train_val_df, test_df = train_test_split(df, test_size=0.15, random_state=42, shuffle=True)
+    train_df, val_df = train_test_split(train_val_df, test_size=0.1765, random_state=42, shuffle=True)  # 0.1765 * 0.85 = 0.15
+    print(f"Train: {len(train_df)}, Val: {len(val_df)}, Test: {len(test_df)}")
+    train_df.to_csv('training_data.csv', index=False)
+    val_df.to_csv('validation_data.csv', index=False)
+    test_df.to_csv('testing_data.csv', index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Join scored news with the indicator table.')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--split', action='store_true', help='also write the train / validation / test split')
+    args = parser.parse_args()
+
+    for p in (NEWS_FILE, PRICE_PATH):
+        if not os.path.exists(p):
+            raise SystemExit(f"Error: '{p}' not found. Place it alongside this script.")
+
+    n_rows, n_days = build_combined(chunk_rows=args.chunk_rows)
+    print(f"→ Wrote {n_rows} headline rows to '{COMBINED_FILE}' and {n_days} stock-days to '{DAILY_FILE}'")
+    if args.split:
+        split_dataset()
@@ -0,0 +1,250 @@
+# Stage-level instrumentation for the pipeline scripts.
+#
+# Every script wraps its stages in span():
+#
+#     with span('indicators') as s:
+#         df = compute_indicators(df)
+#         s.rows = len(df)
+#
+# and nothing else changes. Instrumentation is off unless PIPELINE_REPORT names a
+# report file; span() then returns one shared no-op object, so a disabled span
+# costs a function call and an attribute store.
+#
+# When enabled, each span records its wall time, rows / second (when rows is set),
+# the process RSS at the end and how much it raised the peak RSS, plus its parent
+# span. At exit the run is appended to the report as one JSON line (script, argv,
+# total time, peak RSS, spans), so one file can collect every script of a nightly run.
+#
+# PIPELINE_PROFILE=cprofile also runs cProfile around every outermost span and
+# PIPELINE_PROFILE=sample a stack sampler thread (every PIPELINE_SAMPLE_MS, default
+# 5 ms); the report gets each span's top functions and the raw profile is written
+# next to it (<report>.<span>.prof for pstats / snakeviz, <report>.<span>.folded for
+# flame graph tools).
+#
+# Usage:
+#   PIPELINE_REPORT=run_report.jsonl python stock_feature_engineering.py
+#   PIPELINE_REPORT=run_report.jsonl PIPELINE_PROFILE=sample python portfolio_code/portfolio.py
+
+import atexit
+import cProfile
+import io
+import json
+import multiprocessing
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TOP_FUNCTIONS = 15
+PROFILERS = ('cprofile', 'sample')
+
+_run = None  # the active _Run, None when instrumentation is off
+
+
+def _rss_bytes():
+    # current resident set size (Linux /proc; None elsewhere)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+def _mb(n_bytes):
+    return None if n_bytes is None else round(n_bytes / 2**20, 3)
+
+
+class _NoSpan:
+    # what span() returns when instrumentation is off
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Sampler(threading.Thread):
+    """Samples the main thread's stack every `interval` seconds into folded-stack counts."""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.target = threading.main_thread().ident
+        self.stacks = Counter()
+        self.halt = threading.Event()
+
+    def run(self):
+        while not self.halt.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.halt.set()
+        self.join()
+
+
+class _Span:
+    def __init__(self, run, name, rows):
+        self.run = run
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        run = self.run
+        self.parent = run.stack[-1].name if run.stack else None
+        self.depth = len(run.stack)
+        run.stack.append(self)
+        self.profiler = run.start_profiler() if self.depth == 0 else None
+        self.peak_before = _peak_rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        run = self.run
+        run.stack.pop()
+        peak = _peak_rss_bytes()
+        record = {
+            'name': self.name,
+            'parent': self.parent,
+            'depth': self.depth,
+            'start': round(self.start - run.start, 6),
+            'seconds': round(seconds, 6),
+            'rows': self.rows,
+            'rows_per_sec': round(self.rows / seconds, 1) if self.rows is not None and seconds > 0 else None,
+            'rss_mb': _mb(_rss_bytes()),
+            'peak_rss_mb': _mb(peak),
+            'peak_rss_growth_mb': _mb(peak - self.peak_before) if peak is not None else None,
+            'failed': exc_type is not None,
+        }
+        if self.profiler is not None:
+            record['profile'] = run.stop_profiler(self.profiler, self.name)
+        run.spans.append(record)
+        return False
+
+
+class _Run:
+    def __init__(self, report_path, profile=None, sample_ms=5.0):
+        if profile not in (None,) + PROFILERS:
+            raise ValueError(f"profile must be one of {PROFILERS}, got '{profile}'")
+        self.report_path = report_path
+        self.profile = profile
+        self.sample_interval = sample_ms / 1000
+        self.started = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+        self.stack = []
+        self.spans = []
+
+    def _profile_path(self, name, suffix):
+        safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+        return f'{self.report_path}.{safe}.{suffix}'
+
+    def start_profiler(self):
+        if self.profile == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.profile == 'sample':
+            sampler = _Sampler(self.sample_interval)
+            sampler.start()
+            return sampler
+        return None
+
+    def stop_profiler(self, profiler, name):
+        # stop, write the raw profile next to the report, return the top functions
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            path = self._profile_path(name, 'prof')
+            profiler.dump_stats(path)
+            stats = pstats.Stats(profiler, stream=io.StringIO())
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+            top = [{'function': f'{os.path.basename(file)}:{line}({func})', 'calls': calls,
+                    'tottime': round(tottime, 6), 'cumtime': round(cumtime, 6)}
+                   for (file, line, func), (_, calls, tottime, cumtime, _) in rows]
+            return {'kind': 'cprofile', 'file': path, 'top_cumulative': top}
+
+        profiler.stop()
+        path = self._profile_path(name, 'folded')
+        with open(path, 'w') as f:
+            for stack, count in profiler.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        leaf = Counter()
+        for stack, count in profiler.stacks.items():
+            leaf[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaf.values())
+        top = [{'function': func, 'samples': count, 'share': round(count / total, 4)}
+               for func, count in leaf.most_common(TOP_FUNCTIONS)]
+        return {'kind': 'sample', 'file': path, 'samples': total, 'top_self': top}
+
+    def report(self):
+        return {
+            'script': os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+            'argv': sys.argv[1:],
+            'started': self.started,
+            'seconds': round(time.perf_counter() - self.start, 6),
+            'peak_rss_mb': _mb(_peak_rss_bytes()),
+            'profile': self.profile,
+            'spans': self.spans,
+        }
+
+    def write(self):
+        with open(self.report_path, 'a') as f:
+            f.write(json.dumps(self.report()) + '\n')
+
+
+def span(name, rows=None):
+    """Context manager timing one stage; set .rows on it for rows / second."""
+    if _run is None:
+        return _NO_SPAN
+    return _Span(_run, name, rows)
+
+
+def enabled():
+    return _run is not None
+
+
+def enable(report_path, profile=None, sample_ms=5.0):
+    """Turn instrumentation on; the run is appended to report_path at exit."""
+    global _run
+    if _run is None:
+        atexit.register(_write_report)
+    _run = _Run(report_path, profile, sample_ms)
+    return _run
+
+
+def _write_report():
+    if _run is not None:
+        _run.write()
+
+
+# scripts are instrumented from the environment, no flags needed; worker processes
+# (chart rendering, sweeps) inherit the variable but only the main process reports
+if os.environ.get('PIPELINE_REPORT') and multiprocessing.parent_process() is None:
+    enable(os.environ['PIPELINE_REPORT'], os.environ.get('PIPELINE_PROFILE') or None,
+           float(os.environ.get('PIPELINE_SAMPLE_MS', 5.0)))
@@ -0,0 +1,262 @@
+# Rolling-window and EWM kernels over flat, (ticker, date)-sorted arrays.
+#
+# Every kernel takes the values of all tickers back to back plus each row's position
+# inside its ticker (pos, 0 on a ticker's first row), or the (start, length) offsets
+# from indicators.group_offsets. Windows never cross into the previous ticker and
+# NaNs are skipped like pandas does (min_periods counts the non-NaN values).
+#
+# Rolling min / max (van Herk / Gil-Werman): each ticker is cut into blocks of
+# `window` rows and every block gets a running min / max from its left and from its
+# right. A full window [i - window + 1, i] covers the tail of one block and the head
+# of the next, so its min / max is one comparison of the two scans. That makes the
+# kernel O(n) for any window: it does the job of a monotonic deque with whole-array
+# NumPy operations instead of a per-row loop.
+#
+# Rolling sums, means and std use the same blocks. The running sums inside a block
+# are Kahan-compensated and never span more than `window` rows, so rounding does not
+# build up along a ticker however long it is. This differs from sum(cumsum)
+# differences, which lose digits as the cumulative total grows over ~100 years of SPX.
+# For the variance each block is also shifted by its own mean before squaring, and
+# the two block parts of a window are recombined about a common shift (the
+# shifted-data form of Welford's update). A window whose values are all equal has
+# exactly 0 variance, as in pandas.
+#
+# Segmented EWM: pandas' ewm(adjust=False) recursion, NaN weighting included, is
+# y_t = A_t * y_{t-1} + B_t per row. The maps are composed with a log-step prefix
+# scan (Hillis-Steele) that stops at ticker boundaries. A ticker of n rows takes
+# log2(n) whole-array steps, instead of one Python step per trading day.
+
+import numpy as np
+
+
+def _blocks(pos, window):
+    # block number and column of every row; blocks restart on a ticker's first row
+    col = pos % window
+    block = np.cumsum(col == 0) - 1
+    return block, col, int(block[-1]) + 1 if len(block) else 0
+
+
+def _block_matrix(values, block, col, n_blocks, window, fill):
+    m = np.full((n_blocks, window), fill, dtype=np.float64)
+    m[block, col] = values
+    return m
+
+
+def _kahan_scan(m):
+    # running sum along each row of m, Kahan-compensated; loops over the window's
+    # columns only, every step is one vector operation over all blocks
+    out = np.empty_like(m)
+    total = np.zeros(len(m))
+    comp = np.zeros(len(m))
+    for c in range(m.shape[1]):
+        y = m[:, c] - comp
+        t = total + y
+        comp = (t - total) - y
+        total = t
+        out[:, c] = total
+    return out
+
+
+def _window_count(flags, pos, window):
+    # number of True flags in each row's trailing window within its ticker; integer
+    # cumulative sums are exact, so plain differences do
+    csum = np.concatenate([[0], np.cumsum(flags, dtype=np.int64)])
+    rows = np.arange(len(flags))
+    return csum[rows + 1] - csum[rows - np.minimum(pos, window - 1)]
+
+
+def _split_rows(pos, col, window):
+    # rows whose window starts in the previous block, and that start row
+    split = np.flatnonzero((pos >= window - 1) & (col != window - 1))
+    return split, split - window + 1
+
+
+def _rolling_extreme(values, pos, window, min_periods, func):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy()
+    block, col, n_blocks = _blocks(pos, window)
+    m = _block_matrix(values, block, col, n_blocks, window, np.nan)
+    prefix = func.accumulate(m, axis=1)[block, col]
+    suffix = func.accumulate(m[:, ::-1], axis=1)[:, ::-1][block, col]
+    out = prefix
+    split, first = _split_rows(pos, col, window)
+    out[split] = func(suffix[first], prefix[split])
+    count = _window_count(~np.isnan(values), pos, window)
+    return np.where(count >= min_periods, out, np.nan)
+
+
+def rolling_min(values, pos, window, min_periods):
+    """Minimum of the non-NaN values in each row's trailing window within its ticker."""
+    return _rolling_extreme(values, pos, window, min_periods, np.fmin)
+
+
+def rolling_max(values, pos, window, min_periods):
+    """Maximum of the non-NaN values in each row's trailing window within its ticker."""
+    return _rolling_extreme(values, pos, window, min_periods, np.fmax)
+
+
+def _window_scans(columns, pos, window):
+    # prefix / suffix Kahan sums of every column, per block, read back per row
+    block, col, n_blocks = _blocks(pos, window)
+    scans = []
+    for values in columns:
+        m = _block_matrix(values, block, col, n_blocks, window, 0.0)
+        prefix = _kahan_scan(m)[block, col]
+        suffix = _kahan_scan(m[:, ::-1])[:, ::-1][block, col]
+        scans.append((prefix, suffix))
+    return block, col, scans
+
+
+def window_sum_count(values, pos, window):
+    """Sum and number of the non-NaN values in each row's trailing window within its ticker."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy(), np.zeros(0, dtype=np.int64)
+    valid = ~np.isnan(values)
+    _, col, [(total, total_tail)] = _window_scans([np.where(valid, values, 0.0)], pos, window)
+    split, first = _split_rows(pos, col, window)
+    total[split] += total_tail[first]
+    return total, _window_count(valid, pos, window)
+
+
+def _window_moments(values, pos, window):
+    # count, mean and sum of squared deviations of each row's window
+    valid = ~np.isnan(values)
+    block, col, n_blocks = _blocks(pos, window)
+    x = np.where(valid, values, 0.0)
+    block_n = np.bincount(block, weights=valid, minlength=n_blocks)
+    block_sum = np.bincount(block, weights=x, minlength=n_blocks)
+    shift = np.where(block_n > 0, block_sum / np.maximum(block_n, 1), 0.0)
+    d = np.where(valid, values - shift[block], 0.0)
+
+    _, _, [(s1, s1_tail), (s2, s2_tail)] = _window_scans([d, d * d], pos, window)
+    # the part of the window in the previous block, re-centred on this block's shift
+    split, first = _split_rows(pos, col, window)
+    delta = shift[block[first]] - shift[block[split]]
+    n = _window_count(valid, pos, window)
+    nt = n[split] - _window_count(valid, col, window)[split]
+    s1t = s1_tail[first]
+    s1[split] += s1t + nt * delta
+    s2[split] += s2_tail[first] + 2 * delta * s1t + nt * delta * delta
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = shift[block] + s1 / n
+        m2 = np.maximum(s2 - s1 * s1 / n, 0.0)
+    return n, mean, m2
+
+
+def rolling_mean(values, pos, window, min_periods):
+    """Mean of the non-NaN values in each row's trailing window within its ticker."""
+    total, count = window_sum_count(values, pos, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count >= min_periods, total / count, np.nan)
+
+
+def rolling_std(values, pos, window, min_periods):
+    """Sample (ddof=1) standard deviation over each row's trailing window within its ticker."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy()
+    n, _, m2 = _window_moments(values, pos, window)
+    # equal values have no spread; keep that exact instead of a rounding residue. A
+    # window is flat when none of its non-NaN values but the first differs from the
+    # previous non-NaN value of the ticker.
+    valid = ~np.isnan(values)
+    rows = np.arange(len(values))
+    prev = np.r_[-1, np.maximum.accumulate(np.where(valid, rows, -1))[:-1]]
+    changed = valid & (prev >= rows - pos) & (values != values[np.maximum(prev, 0)])
+    following = np.minimum.accumulate(np.where(valid, rows, len(rows))[::-1])[::-1]
+    first = np.minimum(following[rows - np.minimum(pos, window - 1)], rows)
+    changes = _window_count(changed, pos, window) - changed[first]
+    m2 = np.where(changes == 0, 0.0, m2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(m2 / (n - 1))
+    return np.where((n >= min_periods) & (n > 1), std, np.nan)
+
+
+def segmented_ewm(columns, alphas, starts, lengths, init=None):
+    """EWM of each column of `columns` (n, k), restarted at every ticker boundary.
+
+    pandas ewm(adjust=False, ignore_na=False).mean(): a NaN keeps the previous value
+    and lets its weight decay, the next observation is blended with that weight.
+    The composed maps agree with indicators.ewm_step up to rounding (~1e-15 relative).
+    Rows outside the [start, start + length) ranges are left NaN.
+
+    init is an optional (weighted, old_wt) pair of (n_groups, k) arrays to resume
+    from (NaN weighted = start fresh). Returns the (n, k) output and the final
+    (weighted, old_wt) of every group, in the order of `starts`.
+    """
+    columns = np.asarray(columns, dtype=np.float64)
+    alphas = np.asarray(alphas, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    n_groups, k_cols = len(starts), columns.shape[1]
+    out = np.full(columns.shape, np.nan)
+    if init is None:
+        init_y = np.full((n_groups, k_cols), np.nan)
+        init_wt = np.ones((n_groups, k_cols))
+    else:
+        init_y = np.array(init[0], dtype=np.float64).reshape(n_groups, k_cols)
+        init_wt = np.array(init[1], dtype=np.float64).reshape(n_groups, k_cols)
+    if n_groups == 0 or lengths.sum() == 0:
+        return out, (init_y, init_wt)
+
+    # the active rows of every group, back to back
+    group = np.repeat(np.arange(n_groups), lengths)
+    t = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    rows = starts[group] + t
+    x = columns[rows]
+    obs = ~np.isnan(x)
+    decay = 1.0 - alphas
+
+    # rows since the previous observation of the group (or since the resume point)
+    idx = np.arange(len(rows))[:, None]
+    seen = np.maximum.accumulate(np.where(obs, idx, -1), axis=0)
+    before = np.vstack([np.full((1, k_cols), -1), seen[:-1]])
+    group_first = (idx - t[:, None])
+    has_prev = before >= group_first
+    gap = idx - np.where(has_prev, before, group_first - 1)
+    resumed = ~np.isnan(init_y[group])
+    prior = has_prev | resumed
+    # observations of the group before this row; like indicators.ewm_step, a fresh
+    # first observation keeps the resume weight and only a blend resets it to 1
+    count = np.cumsum(obs, axis=0) - obs
+    count -= count[group_first[:, 0]]
+    blended_before = has_prev & (resumed | (count > 1))
+    old_wt = np.where(blended_before, 1.0, init_wt[group]) * decay ** gap
+
+    # y_t = A * y_{t-1} + B: NaN rows keep y, the first observation takes x
+    with np.errstate(invalid='ignore'):
+        a_map = np.where(obs, np.where(prior, old_wt / (old_wt + alphas), 0.0), 1.0)
+        b_map = np.where(obs, np.where(prior, alphas * x / (old_wt + alphas), x), 0.0)
+    first = t == 0
+    b_map[first] += np.where(resumed[first], a_map[first] * np.nan_to_num(init_y[group[first]]), 0.0)
+    a_map[first] = 0.0
+
+    # inclusive prefix scan of the affine maps, never reaching past a group's first row
+    step = 1
+    while step < lengths.max():
+        ok = (t[step:] >= step)[:, None]
+        a_cur, b_cur = a_map[step:], b_map[step:]
+        b_new = np.where(ok, a_cur * b_map[:-step] + b_cur, b_cur)
+        a_new = np.where(ok, a_cur * a_map[:-step], a_cur)
+        a_map[step:], b_map[step:] = a_new, b_new
+        step *= 2
+
+    # nothing observed yet and nothing to resume from: still NaN
+    y = np.where(prior | obs, b_map, np.nan)
+    out[rows] = y
+
+    # final state per group; a group with no rows keeps its init
+    weighted, last_wt = init_y.copy(), init_wt.copy()
+    live = lengths > 0
+    last = (np.cumsum(lengths) - 1)[live]
+    has_obs = seen[last] >= group_first[last]
+    steps_since = np.where(has_obs, last[:, None] - seen[last], lengths[live][:, None])
+    fresh = np.isnan(init_y[live])
+    n_obs = count[last] + obs[last]
+    weighted[live] = np.where(has_obs | ~fresh, y[last], np.nan)
+    last_wt[live] = np.where(has_obs & (~fresh | (n_obs > 1)), 1.0, init_wt[live])
+    last_wt[live] *= np.where(has_obs | ~fresh, decay ** steps_since, 1.0)
+    return out, (weighted, last_wt)
@@ -0,0 +1,400 @@
+# Live signal service: OHLCV bars in, buy / hold / sell signals out.
+#
+# Each ticker keeps a small TickerState: the last value and weight of every EWM
+# (ema_14, MACD legs and signal, ATR, +/-DM, ADX), the previous bar and fixed-size
+# windows for SMA/STD (5 closes), RSI (14 gains / losses) and L14/H14. A bar updates
+# that state in O(1) -- nothing is recomputed from history -- and yields the same
+# feature row compute_indicators would give. The states are seeded from the carry
+# state stock_feature_engineering.py saves (indicator_state.pkl), so the service
+# picks up exactly where the batch run stopped.
+#
+# Bars arrive from a file being appended to (tailed) or from TCP clients, one
+# all_stocks_5yr.csv line per bar (date,open,high,low,close,volume,Name). Feature
+# rows of all tickers go through one queue; the scorer drains it in micro-batches,
+# runs the nn3 / nn7 models once per batch and writes one signal line per bar.
+# Bar-to-signal latency is measured from the moment a line is read and checked
+# against a budget.
+#
+# Usage:
+#   python live_signals.py --feed new_bars.csv                # tail a file
+#   python live_signals.py --feed new_bars.csv --replay --stub
+#   python live_signals.py --port 9100                        # lines over TCP
+
+import argparse
+import asyncio
+import math
+import os
+import pickle
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from indicators import (ADX_SPAN, ATR_ALPHA, DM_SPAN, EMA_SPAN, MACD_FAST_SPAN, MACD_SIGNAL_SPAN,
+                        MACD_SLOW_SPAN, RAW_COLUMNS, RSI_WINDOW, SMA_WINDOW, STOCH_WINDOW, ewm_alpha)
+
+STATE_FILE = 'indicator_state.pkl'
+SIGNAL_FILE = 'live_signals.csv'
+LATENCY_BUDGET_MS = 50.0
+MAX_BATCH = 512
+
+# EWMs of the per-bar update: name -> alpha (same settings as indicators.py)
+EWM_ALPHAS = {
+    'ema_14': ewm_alpha(span=EMA_SPAN),
+    'ema12_ret': ewm_alpha(span=MACD_FAST_SPAN),
+    'ema26_ret': ewm_alpha(span=MACD_SLOW_SPAN),
+    'macd_signal': ewm_alpha(span=MACD_SIGNAL_SPAN),
+    'atr': ewm_alpha(alpha=ATR_ALPHA),
+    'plus_dm': ewm_alpha(span=DM_SPAN),
+    'minus_dm': ewm_alpha(span=DM_SPAN),
+    'adx': ewm_alpha(span=ADX_SPAN),
+}
+NAN = float('nan')
+
+
+def _ewm_step(weighted, old_wt, x, alpha):
+    # scalar form of indicators.ewm_step (pandas' adjust=False recursion)
+    has, obs = not math.isnan(weighted), not math.isnan(x)
+    if has:
+        old_wt *= 1.0 - alpha
+    if has and obs:
+        if weighted != x:
+            weighted = (old_wt * weighted + alpha * x) / (old_wt + alpha)
+        old_wt = 1.0
+    elif obs:
+        weighted = x
+    return weighted, old_wt
+
+
+def _div(a, b):
+    # float division with NumPy's inf / NaN results instead of ZeroDivisionError
+    if b == 0.0:
+        return NAN if a == 0.0 or math.isnan(a) else math.copysign(math.inf, a)
+    return a / b
+
+
+def _max3(a, b, c):
+    # NaN-propagating like np.maximum
+    return NAN if math.isnan(a) or math.isnan(b) or math.isnan(c) else max(a, b, c)
+
+
+def _nanmin(values):
+    values = [v for v in values if not math.isnan(v)]
+    return min(values) if values else NAN
+
+
+def _nanmax(values):
+    values = [v for v in values if not math.isnan(v)]
+    return max(values) if values else NAN
+
+
+class TickerState:
+    """Indicator state of one ticker, advanced one bar at a time."""
+
+    __slots__ = ('ewm', 'first_close', 'prev', 'closes', 'gains', 'losses', 'lows', 'highs', 'last_date')
+
+    def __init__(self):
+        self.ewm = {name: (NAN, 1.0) for name in EWM_ALPHAS}
+        self.first_close = NAN
+        self.prev = (NAN, NAN, NAN)  # high, low, close of the previous bar
+        self.closes = deque(maxlen=SMA_WINDOW)
+        self.gains = deque(maxlen=RSI_WINDOW)
+        self.losses = deque(maxlen=RSI_WINDOW)
+        self.lows = deque(maxlen=STOCH_WINDOW)
+        self.highs = deque(maxlen=STOCH_WINDOW)
+        self.last_date = ''  # date of the last bar in the state, as YYYY-MM-DD
+
+    @classmethod
+    def from_carry(cls, carry, history):
+        """State after the last bar of a batch run.
+
+        Args:
+            carry (pd.Series): the ticker's row of the saved state's carry frame.
+            history (pd.DataFrame): the ticker's last raw bars (state['history']), by date.
+        """
+        self = cls()
+        for name in EWM_ALPHAS:
+            self.ewm[name] = (float(carry[name]), float(carry[f'{name}_wt']))
+        self.first_close = float(carry['first_close'])
+        high = history['high'].to_numpy(dtype=np.float64)
+        low = history['low'].to_numpy(dtype=np.float64)
+        close = history['close'].to_numpy(dtype=np.float64)
+        for i in range(len(close)):
+            self._push(float(high[i]), float(low[i]), float(close[i]))
+        if len(history):
+            self.last_date = pd.Timestamp(history['date'].max()).strftime('%Y-%m-%d')
+        return self
+
+    def _push(self, high, low, close):
+        # move the bar into the windows; returns (daily_return, gain, loss)
+        daily_return = close / self.prev[2] - 1 if self.prev[2] == self.prev[2] else NAN
+        gain = daily_return if daily_return > 0 else 0.0
+        loss = -daily_return if daily_return < 0 else 0.0
+        self.closes.append(close)
+        self.gains.append(gain)
+        self.losses.append(loss)
+        self.lows.append(low)
+        self.highs.append(high)
+        self.prev = (high, low, close)
+        return daily_return, gain, loss
+
+    def _ewm(self, name, x):
+        weighted, old_wt = _ewm_step(*self.ewm[name], x, EWM_ALPHAS[name])
+        self.ewm[name] = (weighted, old_wt)
+        return weighted
+
+    def update(self, open_, high, low, close):
+        """Advance by one bar and return its indicator columns (dict)."""
+        prev_high, prev_low, prev_close = self.prev
+        if math.isnan(self.first_close):
+            self.first_close = close
+        daily_return, gain, loss = self._push(high, low, close)
+
+        row = {'daily_variation': _div(high - low, open_), 'daily_return': daily_return}
+        closes = self.closes
+        if len(closes) == SMA_WINDOW:
+            mean = sum(closes) / SMA_WINDOW
+            row['sma_7'] = mean
+            row['std_7'] = math.sqrt(sum((c - mean) ** 2 for c in closes) / (SMA_WINDOW - 1))
+        else:
+            row['sma_7'] = row['std_7'] = NAN
+
+        row['ema_14'] = self._ewm('ema_14', close)
+        macd = self._ewm('ema12_ret', daily_return) - self._ewm('ema26_ret', daily_return)
+        row['macd'] = macd
+        row['macd_signal'] = self._ewm('macd_signal', macd)
+        row['cumulative_return'] = _div(close - self.first_close, self.first_close) * 100
+
+        row['gain'], row['loss'] = gain, loss
+        rs = _div(sum(self.gains) / len(self.gains), sum(self.losses) / len(self.losses))
+        row['rsi'] = 100 - _div(100, 1 + rs)
+        l14, h14 = _nanmin(self.lows), _nanmax(self.highs)
+        row['L14'], row['H14'] = l14, h14
+        row['stochastic_oscillator'] = _div(close - l14, h14 - l14) * 100
+
+        row['prev_high'], row['prev_low'], row['prev_close'] = prev_high, prev_low, prev_close
+        true_range = _max3(high - low, abs(high - prev_close), abs(low - prev_close))
+        plus_dir, minus_dir = high - prev_high, prev_low - low
+        plus_dm = plus_dir if plus_dir > minus_dir and plus_dir > 0 else 0.0
+        minus_dm = minus_dir if minus_dir > plus_dir and minus_dir > 0 else 0.0
+        atr = self._ewm('atr', true_range)
+        row['atr'] = atr
+        row['smoothed_plus_dm'] = plus = _div(self._ewm('plus_dm', plus_dm), atr) * 100
+        row['smoothed_minus_dm'] = minus = _div(self._ewm('minus_dm', minus_dm), atr) * 100
+        row['dx'] = dx = _div(abs(plus - minus), abs(plus + minus)) * 100
+        row['adx'] = self._ewm('adx', dx)
+        return row
+
+
+def load_states(path=STATE_FILE):
+    """TickerStates of every ticker in a saved indicator state (empty if there is none).
+
+    Each state's last_date is the ticker's last bar in the saved history, so bars the
+    batch run already contains are skipped like indicators.update_indicators does.
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    history = state['history'].groupby('Name', sort=False)
+    return {name: TickerState.from_carry(carry, history.get_group(name))
+            for name, carry in state['carry'].iterrows()}
+
+
+def parse_bar(line):
+    """One all_stocks_5yr.csv line -> bar dict, or None for headers / malformed lines."""
+    parts = line.strip().split(',')
+    if len(parts) != len(RAW_COLUMNS) or parts[0] == 'date':
+        return None
+    try:
+        return {'date': parts[0], 'open': float(parts[1] or 'nan'), 'high': float(parts[2] or 'nan'),
+                'low': float(parts[3] or 'nan'), 'close': float(parts[4] or 'nan'),
+                'volume': float(parts[5] or 'nan'), 'Name': parts[6]}
+    except ValueError:
+        return None
+
+
+class RsiStubModel:
+    """RSI rule with the same predict(df) interface as nn_inference.LabelModel, for dry runs."""
+
+    name = 'rsi-stub'
+
+    def predict(self, df):
+        rsi = df['rsi'].to_numpy()
+        return np.where(rsi < 30, 'buy', np.where(rsi > 70, 'sell', 'hold')).astype(object)
+
+
+def load_models(stub=False):
+    """{signal column: model} for nn3 / nn7 (torch is only imported here)."""
+    if stub:
+        return {'nn3': RsiStubModel(), 'nn7': RsiStubModel()}
+    from nn_inference import MODEL_FILES, LabelModel, training_stocks
+
+    stocks = training_stocks()
+    return {col: LabelModel(path, stocks) for col, (path, _) in MODEL_FILES.items()}
+
+
+class LatencyTracker:
+    """Bar-to-signal latencies (last `keep` of them) against a budget in milliseconds."""
+
+    def __init__(self, budget_ms=LATENCY_BUDGET_MS, keep=100_000):
+        self.budget_ms = budget_ms
+        self.samples = deque(maxlen=keep)
+        self.count = 0
+        self.over_budget = 0
+
+    def record(self, latency_ms):
+        self.samples.append(latency_ms)
+        self.count += 1
+        self.over_budget += latency_ms > self.budget_ms
+
+    def summary(self):
+        if not self.samples:
+            return {'signals': 0}
+        p50, p99 = np.percentile(np.asarray(self.samples), [50, 99])
+        return {'signals': self.count, 'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3),
+                'max_ms': round(max(self.samples), 3), 'over_budget': self.over_budget,
+                'budget_ms': self.budget_ms}
+
+
+class SignalService:
+    """Per-bar indicator updates for the whole universe and micro-batched scoring.
+
+    Args:
+        states (dict): ticker -> TickerState (see load_states); unseen tickers start fresh.
+        models (dict): signal column -> model with predict(df), e.g. from load_models.
+        out (file): where signal lines are written (CSV with a header).
+        sentiment (dict): ticker -> latest sentiment score; 0 (neutral) otherwise.
+        budget_ms (float): bar-to-signal latency budget.
+        max_batch (int): most bars scored in one model call.
+    """
+
+    def __init__(self, states, models, out, sentiment=None, budget_ms=LATENCY_BUDGET_MS, max_batch=MAX_BATCH):
+        self.states = states
+        self.models = models
+        self.out = out
+        self.sentiment = sentiment or {}
+        self.max_batch = max_batch
+        self.latency = LatencyTracker(budget_ms)
+        self.queue = asyncio.Queue()
+        out.write(','.join(['date', 'stock'] + list(models) + ['latency_ms']) + '\n')
+
+    def on_bar(self, bar, received):
+        """Update the ticker's state and queue its feature row (no await: order per ticker is kept)."""
+        name = bar['Name']
+        state = self.states.get(name)
+        if state is None:
+            state = self.states[name] = TickerState()
+        if bar['date'] <= state.last_date:
+            return  # late, repeated or already in the batch state
+        state.last_date = bar['date']
+        row = state.update(bar['open'], bar['high'], bar['low'], bar['close'])
+        row.update(date=bar['date'], stock=name, open=bar['open'], high=bar['high'], low=bar['low'],
+                   close=bar['close'], volume=bar['volume'], sentiment=self.sentiment.get(name, 0.0))
+        self.queue.put_nowait((row, received))
+
+    async def score(self):
+        """Score queued rows in batches until cancelled (or a None sentinel arrives)."""
+        done = False
+        while not done:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if not batch:
+                continue
+            frame = pd.DataFrame([row for row, _ in batch])
+            predictions = {col: model.predict(frame) for col, model in self.models.items()}
+            now = time.perf_counter()
+            lines = []
+            for i, (row, received) in enumerate(batch):
+                latency_ms = (now - received) * 1000
+                self.latency.record(latency_ms)
+                signals = ['' if predictions[col][i] is None else predictions[col][i] for col in self.models]
+                lines.append(','.join([row['date'], row['stock']] + signals + [f'{latency_ms:.3f}']))
+            self.out.write('\n'.join(lines) + '\n')
+            self.out.flush()
+            # let the feeds run between batches
+            await asyncio.sleep(0)
+
+    async def tail(self, path, replay=False, poll=0.05):
+        """Read bars appended to path; with replay, stop at the end of the file.
+
+        A line is only parsed once its newline has been written; the start of a line
+        the writer is still appending is kept until the rest arrives. With replay the
+        file is complete, so a last line without a newline is read as well.
+        """
+        partial = ''
+        with open(path) as f:
+            while True:
+                line, partial = partial + f.readline(), ''
+                if not line.endswith('\n'):
+                    if replay and not line:
+                        return
+                    if not replay:
+                        partial = line
+                        await asyncio.sleep(poll)
+                        continue
+                bar = parse_bar(line)
+                if bar is not None:
+                    self.on_bar(bar, time.perf_counter())
+                    if self.queue.qsize() >= self.max_batch:
+                        await asyncio.sleep(0)
+
+    async def _client(self, reader, writer):
+        while line := await reader.readline():
+            bar = parse_bar(line.decode())
+            if bar is not None:
+                self.on_bar(bar, time.perf_counter())
+        writer.close()
+
+    async def serve(self, host, port):
+        """Accept bar lines from any number of TCP clients until cancelled."""
+        server = await asyncio.start_server(self._client, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+async def run(service, feed=None, replay=False, host='127.0.0.1', port=None):
+    scorer = asyncio.create_task(service.score())
+    try:
+        if feed is not None:
+            await service.tail(feed, replay)
+        else:
+            await service.serve(host, port)
+    finally:
+        service.queue.put_nowait(None)
+        await scorer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream bars through the indicators and label models.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--feed', help='CSV file of bars to tail')
+    source.add_argument('--port', type=int, help='listen for bar lines on this TCP port')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--replay', action='store_true', help='stop at the end of --feed instead of waiting')
+    parser.add_argument('--state', default=STATE_FILE)
+    parser.add_argument('--out', default=SIGNAL_FILE)
+    parser.add_argument('--budget-ms', type=float, default=LATENCY_BUDGET_MS)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--stub', action='store_true', help='RSI rule instead of the saved models')
+    args = parser.parse_args()
+
+    if args.feed and not os.path.isfile(args.feed):
+        raise SystemExit(f"Error: '{args.feed}' not found. Place it alongside this script.")
+
+    states = load_states(args.state)
+    print(f"Seeded {len(states)} tickers from '{args.state}'")
+    with open(args.out, 'w') as out:
+        service = SignalService(states, load_models(args.stub), out, budget_ms=args.budget_ms,
+                                max_batch=args.max_batch)
+        try:
+            asyncio.run(run(service, args.feed, args.replay, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    print(f"Latency: {service.latency.summary()}")
+    print(f"→ Wrote signals to '{args.out}'")
@@ -0,0 +1,184 @@
+# Index series (SPX.csv and the like) next to the per-stock panel, plus
+# market-relative features for every ticker.
+#
+# An index file has Yahoo-style columns (Date, Open, High, Low, Close, Adj Close,
+# Volume) and can go back decades: SPX.csv starts in 1927, where the early bars have
+# open = high = low = close and no volume. load_index maps it onto the panel's raw
+# schema with the index symbol as Name. The indicator set is then computed exactly as
+# for the stocks (indicators.compute_indicators), and the result is stored with the
+# compact schema in a dataset partitioned like stocks_with_indicators.parquet. That
+# makes it readable with storage.read_table / query.open_store. The stock panel
+# itself is left as it is, so the training data does not change.
+#
+# Market-relative features, per stock row, against the benchmark index:
+#   market_return  index close-to-close return over the same dates as the stock's
+#                  daily return (previous row of the stock -> this row)
+#   beta           rolling OLS slope of stock returns on market returns
+#   market_corr    rolling correlation of the two
+#   rel_strength   stock return over RS_WINDOW rows / index return over the same
+#                  dates, minus 1
+# The regressions are computed for every ticker at once from trailing-window sums of
+# each term (x, y, xy, xx, yy), cut at the ticker's first row. kernels.window_sum_count
+# gives those in O(n) for any window with Kahan-compensated block sums. Those stay
+# accurate over decades of index history, where differences of one cumulative sum
+# would lose digits.
+#
+# Usage:
+#   python market.py                                  # SPX.csv against stocks_with_indicators.parquet
+#   python market.py --index SPX.csv NDX.csv --beta-window 120
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import kernels
+from indicators import compact_frame, compute_indicators, group_offsets, group_shift
+from instrument import span
+from storage import read_table, write_table
+
+INDEX_FILES = ['SPX.csv']
+PRICE_PATH = 'stocks_with_indicators.parquet'
+INDEX_DATASET = 'index_with_indicators.parquet'
+MARKET_DATASET = 'market_features.parquet'
+
+INDEX_CSV_COLUMNS = {'Date': 'date', 'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close',
+                     'Volume': 'volume'}
+MARKET_COLUMNS = ['market_return', 'beta', 'market_corr', 'rel_strength']
+BETA_WINDOW = 60
+BETA_MIN_PERIODS = 20
+RS_WINDOW = 20
+
+
+def index_symbol(path):
+    """Symbol an index file is stored under: its file name without extension (SPX.csv -> SPX)."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def load_index(path, symbol=None):
+    """An index CSV as raw panel rows (date, open, high, low, close, volume, Name)."""
+    df = pd.read_csv(path, usecols=list(INDEX_CSV_COLUMNS), parse_dates=['Date']).rename(columns=INDEX_CSV_COLUMNS)
+    df['volume'] = df['volume'].fillna(0).astype(np.int64)
+    df['Name'] = symbol or index_symbol(path)
+    return df.dropna(subset=['close'])
+
+
+def _rolling_sums(columns, pos, window):
+    # trailing `window`-row sums within each ticker
+    return [kernels.window_sum_count(values, pos, window)[0] for values in columns]
+
+
+def rolling_regression(y, x, pos, window, min_periods):
+    """Rolling OLS slope and correlation of y on x within each ticker.
+
+    Args:
+        y, x (np.ndarray): flat arrays sorted by (ticker, date); NaN pairs are skipped.
+        pos (np.ndarray): each row's position inside its ticker.
+        window (int): rows per window (including the current one).
+        min_periods (int): fewer valid pairs than this give NaN.
+
+    Returns:
+        (np.ndarray, np.ndarray): beta and correlation per row.
+    """
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    n, sx, sy, sxy, sxx, syy = _rolling_sums([valid.astype(np.float64), x, y, x * y, x * x, y * y],
+                                             pos, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sxy - sx * sy
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        beta = cov / var_x
+        corr = cov / np.sqrt(var_x * var_y)
+    enough = n >= min_periods
+    return np.where(enough, beta, np.nan), np.where(enough, corr, np.nan)
+
+
+def market_features(prices, index, beta_window=BETA_WINDOW, rs_window=RS_WINDOW,
+                    min_periods=BETA_MIN_PERIODS):
+    """MARKET_COLUMNS for every (Name, date) row of prices against one index.
+
+    Args:
+        prices (pd.DataFrame): stock rows with Name, date and close.
+        index (pd.DataFrame): index rows with date and close (one symbol).
+
+    Returns:
+        pd.DataFrame: Name, date and MARKET_COLUMNS, sorted by (Name, date). Rows on
+        dates the index has no bar for get NaN market values.
+    """
+    prices = prices[['Name', 'date', 'close']].sort_values(['Name', 'date'], kind='stable').reset_index(drop=True)
+    starts, lengths = group_offsets(prices['Name'].to_numpy())
+    pos = np.arange(len(prices)) - np.repeat(starts, lengths)
+    remaining = np.repeat(lengths, lengths) - pos - 1
+
+    # the index close on each stock row's date
+    index = index.sort_values('date')
+    index_dates = index['date'].to_numpy(dtype='datetime64[ns]')
+    dates = prices['date'].to_numpy(dtype='datetime64[ns]')
+    at = np.minimum(np.searchsorted(index_dates, dates), max(len(index_dates) - 1, 0))
+    found = (index_dates[at] == dates) if len(index_dates) else np.zeros(len(dates), dtype=bool)
+    market_close = np.where(found, index['close'].to_numpy(dtype=np.float64)[at], np.nan)
+
+    close = prices['close'].to_numpy(dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stock_return = close / group_shift(close, pos, remaining, 1) - 1
+        market_return = market_close / group_shift(market_close, pos, remaining, 1) - 1
+        rel_strength = ((close / group_shift(close, pos, remaining, rs_window))
+                        / (market_close / group_shift(market_close, pos, remaining, rs_window)) - 1)
+    beta, corr = rolling_regression(stock_return, market_return, pos, beta_window, min_periods)
+
+    return pd.concat([prices[['Name', 'date']], pd.DataFrame({
+        'market_return': market_return,
+        'beta': beta,
+        'market_corr': corr,
+        'rel_strength': rel_strength,
+    })], axis=1)
+
+
+def ingest(index_files=INDEX_FILES, price_path=PRICE_PATH, index_out=INDEX_DATASET, market_out=MARKET_DATASET,
+           beta_window=BETA_WINDOW, rs_window=RS_WINDOW):
+    """Store the indicators of every index file and the stocks' features against the first one.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): index indicator rows and market feature rows.
+    """
+    with span('read_index') as s:
+        raw = pd.concat([load_index(path) for path in index_files], ignore_index=True)
+        s.rows = len(raw)
+    with span('index_indicators', rows=len(raw)):
+        indexes = compute_indicators(raw)
+    with span('write_index', rows=len(indexes)):
+        write_table(compact_frame(indexes), index_out)
+
+    benchmark = index_symbol(index_files[0])
+    with span('read_prices') as s:
+        prices = read_table(price_path, columns=['close'])
+        s.rows = len(prices)
+    with span('market_features', rows=len(prices)):
+        features = market_features(prices, indexes[indexes['Name'] == benchmark], beta_window, rs_window)
+    with span('write_features', rows=len(features)):
+        write_table(compact_frame(features), market_out)
+    return indexes, features
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index indicators and market-relative stock features.')
+    parser.add_argument('--index', nargs='+', default=INDEX_FILES,
+                        help='index CSVs; features are computed against the first one')
+    parser.add_argument('--prices', default=PRICE_PATH)
+    parser.add_argument('--beta-window', type=int, default=BETA_WINDOW)
+    parser.add_argument('--rs-window', type=int, default=RS_WINDOW)
+    args = parser.parse_args()
+
+    for path in args.index + [args.prices]:
+        if not os.path.exists(path):
+            raise SystemExit(f"Error: '{path}' not found. Place it alongside this script.")
+
+    indexes, features = ingest(args.index, args.prices, beta_window=args.beta_window, rs_window=args.rs_window)
+    spans = indexes.groupby('Name')['date'].agg(['min', 'max', 'size'])
+    for name, row in spans.iterrows():
+        print(f"{name}: {row['size']} bars, {row['min']:%Y-%m-%d} to {row['max']:%Y-%m-%d}")
+    print(f"→ Wrote index indicators to '{INDEX_DATASET}' and {len(features)} market feature rows "
+          f"to '{MARKET_DATASET}'")
@@ -0,0 +1,142 @@
+# Batch inference for the MLPs trained in neural_network.ipynb
+# (stock_label3_model.pth -> nn3, stock_label7_model.pth -> nn7).
+#
+# The checkpoint is loaded once together with the StandardScaler and label encoder
+# saved next to the weights, instead of re-fitting a scaler / encoder on every split
+# as the notebook does. Features are prepared the same way as in the notebook and
+# scored in fixed-size chunks under torch.inference_mode.
+#
+# Usage:
+#   python nn_inference.py selected_data.csv out.csv [--threads 4]
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+
+MODEL_FILES = {
+    'nn3': ('stock_label3_model.pth', 'label_3'),
+    'nn7': ('stock_label7_model.pth', 'label_7'),
+}
+CHUNK_ROWS = 8192
+TRAINING_DATA = 'training_data.csv'
+
+# training_data.csv columns after dropping date / title / the labels, with the
+# LabelEncoder'd stock appended last (the order the scaler and first layer expect)
+FEATURE_COLUMNS = [
+    'open', 'high', 'low', 'close', 'volume',
+    'daily_variation', 'daily_return', 'sma_7', 'std_7', 'ema_14', 'macd', 'macd_signal',
+    'cumulative_return', 'gain', 'loss', 'rsi', 'L14', 'H14', 'stochastic_oscillator',
+    'prev_high', 'prev_low', 'prev_close', 'atr', 'smoothed_plus_dm', 'smoothed_minus_dm',
+    'dx', 'adx', 'sentiment', 'stock_id',
+]
+
+
+class MLP(nn.Module):
+    def __init__(self, in_dim, hid_dim, num_classes=3):
+        super().__init__()
+        self.net = nn.Sequential(
+            nn.Linear(in_dim, hid_dim),
+            nn.ReLU(),
+            nn.Linear(hid_dim, hid_dim),
+            nn.ReLU(),
+            nn.Linear(hid_dim, num_classes)
+        )
+
+    def forward(self, x):
+        return self.net(x)
+
+
+class LabelModel:
+    """One saved MLP with its scaler and label encoder.
+
+    Args:
+        path (str): .pth checkpoint written by neural_network.ipynb.
+        stock_classes (list): tickers of the training data (training_stocks()), used for
+            stock_id. The saved stock_encoder only holds the integer ids, and encoding the
+            scored frame's own tickers would give ids the model was not trained on, so
+            they are required.
+    """
+
+    def __init__(self, path, stock_classes):
+        if stock_classes is None:
+            raise ValueError(f"no training tickers for '{path}': stock_id needs the stocks of "
+                             f"'{TRAINING_DATA}' (see training_stocks)")
+        checkpoint = torch.load(path, map_location='cpu', weights_only=False)
+        state = checkpoint['model_state_dict']
+        in_dim, hid_dim = state['net.0.weight'].shape[1], state['net.0.weight'].shape[0]
+        self.model = MLP(in_dim, hid_dim, num_classes=state['net.4.weight'].shape[0])
+        self.model.load_state_dict(state)
+        self.model.eval()
+
+        self.scaler = checkpoint['scaler']
+        # saved as 'label_encoder' by the notebook, 'label_encoder_3' / '_7' in the shipped files
+        self.classes = next(v for k, v in checkpoint.items() if k.startswith('label_encoder')).classes_
+        self.stock_classes = np.sort(np.unique(np.asarray(stock_classes, dtype=str)))
+
+    def features(self, df):
+        """Scaled feature matrix and the mask of rows that have one (no NaN / inf)."""
+        # tickers the model was not trained on get no stock_id and no prediction
+        stocks = df['stock'].astype(str).to_numpy()
+        stock_id = np.searchsorted(self.stock_classes, stocks)
+        known = stock_id < len(self.stock_classes)
+        known[known] = self.stock_classes[stock_id[known]] == stocks[known]
+        stock_id = np.where(known, stock_id, -1)
+
+        X = df[FEATURE_COLUMNS[:-1]].to_numpy(dtype=np.float64)
+        X = np.column_stack([X, stock_id])
+        valid = np.isfinite(X).all(axis=1) & (stock_id >= 0)
+        return self.scaler.transform(X[valid]).astype(np.float32), valid
+
+    def predict(self, df, chunk_rows=CHUNK_ROWS):
+        """Predicted label per row of df (None where the features are missing)."""
+        X, valid = self.features(df)
+        pred = np.empty(len(X), dtype=np.int64)
+        with torch.inference_mode():
+            for start in range(0, len(X), chunk_rows):
+                logits = self.model(torch.from_numpy(X[start:start + chunk_rows]))
+                pred[start:start + chunk_rows] = logits.argmax(dim=1).numpy()
+        labels = np.full(len(df), None, dtype=object)
+        labels[valid] = self.classes[pred]
+        return labels
+
+
+def add_predictions(df, stock_classes, model_files=MODEL_FILES, chunk_rows=CHUNK_ROWS, num_threads=None):
+    """Return a copy of df with one predicted label column per model (nn3, nn7).
+
+    stock_classes are the training tickers, e.g. training_stocks().
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    df = df.copy()
+    for col, (path, _) in model_files.items():
+        df[col] = LabelModel(path, stock_classes).predict(df, chunk_rows)
+    return df
+
+
+def training_stocks(path=TRAINING_DATA):
+    """Tickers the models were trained on, if the training split is around."""
+    if not os.path.isfile(path):
+        return None
+    return pd.read_csv(path, usecols=['stock'])['stock'].unique()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score feature rows with the saved label_3 / label_7 MLPs.')
+    parser.add_argument('features_csv')
+    parser.add_argument('output_csv')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    for p in [args.features_csv, TRAINING_DATA] + [path for path, _ in MODEL_FILES.values()]:
+        if not os.path.isfile(p):
+            raise SystemExit(f"Error: '{p}' not found. Place it alongside this script.")
+
+    df = pd.read_csv(args.features_csv)
+    df = add_predictions(df, training_stocks(), chunk_rows=args.chunk_rows, num_threads=args.threads)
+    df.to_csv(args.output_csv, index=False)
+    print(f"→ Wrote {len(df)} rows with {list(MODEL_FILES)} to '{args.output_csv}'")
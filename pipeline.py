@@ -0,0 +1,307 @@
+# Pipeline runner: the whole chain from all_stocks_5yr.csv to the portfolio graphs,
+# declared once as stages with their input / output files.
+#
+# A stage's fingerprint hashes its command, the parameters it uses, the content of
+# its code files and the content of its inputs. A stage whose fingerprint matches
+# the last successful run, and whose outputs are all still there, is skipped; so
+# after changing only trade_fraction just the backtest reruns, and the graphs only
+# if the trade list actually changed. File hashes are cached by (size, mtime), so
+# unchanged inputs are not re-read.
+#
+# The order comes from the files: a stage waits for the stages producing its
+# inputs, stages that do not depend on each other (the label_3 / label_7 model
+# runs, the sentiment scoring next to the indicators) run at the same time. A stage
+# whose input is missing and that no stage produces keeps its existing outputs, or
+# is reported as blocked (with its dependents) when it has none, instead of stopping
+# the run. Every stage runs as its own process with
+# its output in .pipeline/logs/<stage>.log.
+#
+# Usage:
+#   python pipeline.py                                  # everything that is out of date
+#   python pipeline.py graphs                           # only what the graphs need
+#   python pipeline.py --set trade_fraction=0.25        # portfolio parameter change
+#   python pipeline.py --dry-run
+#   python pipeline.py --force features
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+STATE_DIR = '.pipeline'
+STATE_FILE = os.path.join(STATE_DIR, 'state.json')
+LOG_DIR = os.path.join(STATE_DIR, 'logs')
+
+# parameters a stage can use in its command as {name}; only the ones a stage uses
+# are part of its fingerprint
+PARAMS = {
+    'portfolio_size': 1_000_000.0,
+    'trade_fraction': 0.20,
+    'search_trials': 0,
+    'cost_bps': 5.0,
+    'slippage_bps': 5.0,
+}
+
+
+def stage(name, cmd, inputs=(), outputs=(), code=()):
+    # cmd[0] and code are paths in the repo; inputs / outputs are relative to the
+    # working directory, where the data files live
+    return {'name': name, 'cmd': cmd, 'inputs': list(inputs), 'outputs': list(outputs), 'code': list(code)}
+
+
+STAGES = [
+    stage('features', ['stock_feature_engineering.py'],
+          inputs=['all_stocks_5yr.csv'],
+          outputs=['stocks_with_indicators.parquet', 'indicator_state.pkl'],
+          code=['stock_feature_engineering.py', 'indicators.py', 'kernels.py', 'storage.py', 'instrument.py']),
+    stage('market', ['market.py'],
+          inputs=['SPX.csv', 'stocks_with_indicators.parquet'],
+          outputs=['index_with_indicators.parquet', 'market_features.parquet'],
+          code=['market.py', 'indicators.py', 'kernels.py', 'storage.py', 'instrument.py']),
+    stage('sentiment', ['sentiment.py'],
+          inputs=['analyst_ratings_processed.csv', 'all_stocks_5yr.csv'],
+          outputs=['finBert_sentiment.csv'],
+          code=['sentiment.py', 'instrument.py']),
+    stage('training_data', ['data_processing.py', '--split'],
+          inputs=['finBert_sentiment.csv', 'stocks_with_indicators.parquet'],
+          outputs=['combined_data.csv', 'daily_sentiment.csv', 'training_data.csv',
+                   'validation_data.csv', 'testing_data.csv'],
+          code=['data_processing.py', 'indicators.py', 'kernels.py', 'storage.py', 'instrument.py']),
+    stage('xgb_label_3', ['xgb_search.py', '--target', 'label_3', '--trials', '{search_trials}'],
+          inputs=['training_data.csv'], outputs=['xgb_search_label_3.csv'],
+          code=['xgb_search.py', 'walk_forward.py']),
+    stage('xgb_label_7', ['xgb_search.py', '--target', 'label_7', '--trials', '{search_trials}'],
+          inputs=['training_data.csv'], outputs=['xgb_search_label_7.csv'],
+          code=['xgb_search.py', 'walk_forward.py']),
+    stage('walk_forward_label_3', ['walk_forward.py', '--target', 'label_3'],
+          inputs=['training_data.csv'], outputs=['walk_forward_label_3.csv'],
+          code=['walk_forward.py', 'nn_inference.py']),
+    stage('walk_forward_label_7', ['walk_forward.py', '--target', 'label_7'],
+          inputs=['training_data.csv'], outputs=['walk_forward_label_7.csv'],
+          code=['walk_forward.py', 'nn_inference.py']),
+    # selected_data_completed.csv (xg / log predictions) and the .pth files come
+    # from the model notebooks
+    stage('combine_labels', ['portfolio_code/portfolio_combine_labels.py'],
+          inputs=['selected_data_completed.csv', 'selected_data.csv', 'training_data.csv',
+                  'stock_label3_model.pth', 'stock_label7_model.pth'],
+          outputs=['selected_data_with_nn.arrow'],
+          code=['portfolio_code/portfolio_combine_labels.py', 'portfolio_code/label_merge.py',
+                'nn_inference.py', 'storage.py', 'instrument.py']),
+    stage('backtest', ['portfolio_code/portfolio.py', '--portfolio-size', '{portfolio_size}',
+                       '--trade-fraction', '{trade_fraction}'],
+          inputs=['selected_data_with_nn.arrow'],
+          outputs=['portfolio_details/trade_list.csv'],
+          code=['portfolio_code/portfolio.py', 'portfolio_code/backtest.py', 'storage.py', 'instrument.py']),
+    stage('simulate', ['portfolio_code/simulator.py', '--portfolio-size', '{portfolio_size}',
+                       '--trade-fraction', '{trade_fraction}', '--cost-bps', '{cost_bps}',
+                       '--slippage-bps', '{slippage_bps}'],
+          inputs=['selected_data_with_nn.arrow'],
+          outputs=['portfolio_details/simulation_daily.csv', 'portfolio_details/simulation_fills.csv',
+                   'portfolio_details/simulation_summary.csv'],
+          code=['portfolio_code/simulator.py', 'portfolio_code/backtest.py', 'storage.py', 'instrument.py']),
+    stage('signal_stats', ['portfolio_code/signal_stats.py'],
+          inputs=['selected_data_with_nn.arrow'],
+          outputs=['top10_longest_streaks.csv', 'portfolio_details/top10_label_3_streaks.csv',
+                   'portfolio_details/signal_stats.csv', 'portfolio_details/model_agreement.csv'],
+          code=['portfolio_code/signal_stats.py', 'storage.py', 'instrument.py']),
+    stage('graphs', ['portfolio_code/portfolio_graphs.py'],
+          inputs=['portfolio_details/trade_list.csv', 'selected_data_with_nn.arrow'],
+          outputs=['portfolio_details/graphs'],
+          code=['portfolio_code/portfolio_graphs.py', 'portfolio_code/equity_curve.py',
+                'charts.py', 'query.py', 'storage.py', 'instrument.py']),
+]
+
+
+class FileHasher:
+    """sha256 of files and directories, cached by (size, mtime) across runs."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def file(self, path):
+        stat = os.stat(path)
+        key = [stat.st_size, stat.st_mtime_ns]
+        hit = self.cache.get(path)
+        if hit is not None and hit[:2] == key:
+            return hit[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        self.cache[path] = key + [digest]
+        return digest
+
+    def path(self, path):
+        """Hash of a file, or of every file under a directory (with relative names)."""
+        if not os.path.isdir(path):
+            return self.file(path)
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).encode())
+                h.update(self.file(full).encode())
+        return h.hexdigest()
+
+
+def command(spec, params):
+    """The stage's argv with its {parameters} filled in, and the parameters it used."""
+    used = {name: value for name, value in params.items()
+            if any(f'{{{name}}}' in part for part in spec['cmd'])}
+    argv = [part.format(**params) for part in spec['cmd']]
+    return [sys.executable, os.path.join(REPO, argv[0])] + argv[1:], used
+
+
+def fingerprint(spec, params, hasher):
+    _, used = command(spec, params)
+    parts = {
+        'cmd': [part.format(**params) for part in spec['cmd']],
+        'params': used,
+        'code': {path: hasher.path(os.path.join(REPO, path)) for path in spec['code']},
+        'inputs': {path: hasher.path(path) for path in spec['inputs']},
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def plan(stages, targets=None):
+    """Stages needed for targets (all when None), with each stage's upstream stage names."""
+    producer = {out: spec['name'] for spec in stages for out in spec['outputs']}
+    upstream = {spec['name']: sorted({producer[p] for p in spec['inputs'] if p in producer}) for spec in stages}
+    if targets:
+        unknown = set(targets) - set(upstream)
+        if unknown:
+            raise SystemExit(f"Error: unknown stage(s) {sorted(unknown)}; stages are {list(upstream)}")
+        needed, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in needed:
+                needed.add(name)
+                todo.extend(upstream[name])
+        stages = [spec for spec in stages if spec['name'] in needed]
+    return stages, {spec['name']: upstream[spec['name']] for spec in stages}
+
+
+def _run_stage(spec, argv):
+    os.makedirs(LOG_DIR, exist_ok=True)
+    start = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{spec['name']}.log"), 'w') as log:
+        code = subprocess.run(argv, stdout=log, stderr=subprocess.STDOUT).returncode
+    return code, time.perf_counter() - start
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.isfile(path):
+        return {'files': {}, 'stages': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+
+def run_pipeline(stages=STAGES, params=PARAMS, targets=None, force=(), max_workers=None, dry_run=False):
+    """Run every out-of-date stage, independent ones in parallel.
+
+    Returns:
+        dict: stage name -> 'ran', 'skipped', 'would run', 'failed' or 'blocked'.
+    """
+    stages, upstream = plan(stages, targets)
+    state = load_state()
+    hasher = FileHasher(state['files'])
+    produced = {out for spec in stages for out in spec['outputs']}
+    status = {}
+    pending = {spec['name']: spec for spec in stages}
+    running = {}
+
+    def finish(name, result, detail=''):
+        status[name] = result
+        print(f"  {result:9s} {name}{'  ' + detail if detail else ''}")
+
+    def start(spec, pool):
+        # skip, block or submit a stage whose upstream stages are all finished
+        name = spec['name']
+        bad = [up for up in upstream[name] if status[up] in ('failed', 'blocked')]
+        if bad:
+            return finish(name, 'blocked', f"('{bad[0]}' {status[bad[0]]})")
+        missing = [p for p in spec['inputs'] if not os.path.exists(p) and not (dry_run and p in produced)]
+        missing += [p for p in spec['code'] if not os.path.exists(os.path.join(REPO, p))]
+        if missing and all(os.path.exists(p) for p in spec['outputs']):
+            # e.g. files made by the notebooks: keep using what is there
+            return finish(name, 'skipped', f"(missing '{missing[0]}', keeping its outputs)")
+        if missing:
+            return finish(name, 'blocked', f"(missing '{missing[0]}')")
+        if dry_run and any(status[up] == 'would run' for up in upstream[name]):
+            return finish(name, 'would run', '(inputs change upstream)')
+        key = fingerprint(spec, params, hasher)
+        if (state['stages'].get(name) == key and name not in force
+                and all(os.path.exists(p) for p in spec['outputs'])):
+            return finish(name, 'skipped')
+        argv, _ = command(spec, params)
+        if dry_run:
+            return finish(name, 'would run', ' '.join(argv[1:]))
+        print(f"  {'started':9s} {name}  {' '.join(argv[1:])}")
+        running[pool.submit(_run_stage, spec, argv)] = (name, key)
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as pool:
+        while pending or running:
+            ready = [name for name in pending if all(up in status for up in upstream[name])]
+            for name in ready:
+                start(pending.pop(name), pool)
+            if ready and not running:
+                continue  # skipped / blocked stages may have made others ready
+            if not running:
+                raise RuntimeError(f"stages {sorted(pending)} wait on each other")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key = running.pop(future)
+                code, seconds = future.result()
+                if code == 0:
+                    # the fingerprint of what this run actually consumed
+                    state['stages'][name] = key
+                else:
+                    state['stages'].pop(name, None)
+                finish(name, 'ran' if code == 0 else 'failed',
+                       f"({seconds:.1f}s, exit {code}, log in {LOG_DIR}/{name}.log)")
+                save_state(state)
+    if not dry_run:
+        save_state(state)
+    return status
+
+
+def parse_params(pairs):
+    params = dict(PARAMS)
+    for pair in pairs:
+        name, sep, value = pair.partition('=')
+        if not sep or name not in PARAMS:
+            raise SystemExit(f"Error: --set expects name=value with name in {list(PARAMS)}, got '{pair}'")
+        params[name] = type(PARAMS[name])(value)
+    return params
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the out-of-date pipeline stages.')
+    parser.add_argument('targets', nargs='*', help='stages to bring up to date (default: all)')
+    parser.add_argument('--set', nargs='+', default=[], metavar='NAME=VALUE', help=f'parameters: {list(PARAMS)}')
+    parser.add_argument('--force', nargs='+', default=[], metavar='STAGE', help='rerun these stages')
+    parser.add_argument('--jobs', type=int, default=None, help='stages run at the same time')
+    parser.add_argument('--dry-run', action='store_true', help='only show what would run')
+    args = parser.parse_args()
+
+    status = run_pipeline(STAGES, parse_params(args.set), args.targets, set(args.force), args.jobs, args.dry_run)
+    counts = Counter(status.values())
+    print(f"→ {', '.join(f'{n} {result}' for result, n in counts.items())}")
+    if counts['failed'] or counts['blocked']:
+        sys.exit(1)
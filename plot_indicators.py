@@ -1,23 +1,17 @@
 # This file plots individial tickers 
 # Change code at bottom to olot using ticker name and dates
 
-import pandas as pd
 import matplotlib.pyplot as plt
 
-def plot_candlestick_with_indicators(csv_file, symbol, start_date, end_date):
-    # Load dates
-    df = pd.read_csv(csv_file, parse_dates=['date'])
-    
-    # Sort using ticker & date
-    mask = (
-        (df['date'] >= pd.to_datetime(start_date)) &
-        (df['date'] <= pd.to_datetime(end_date)) &
-        (df['Name'] == symbol)
-    )
-    df = df.loc[mask].copy()
-    
-    df.sort_values('date', inplace=True)
-    df.reset_index(drop=True, inplace=True)
+from query import open_store
+from charts import draw_candles
+
+PLOT_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'sma_7', 'ema_14', 'macd', 'macd_signal']
+
+def plot_candlestick_with_indicators(data_path, symbol, start_date, end_date):
+    # Load only this ticker, date window and the plotted columns (binary search over
+    # the memory-mapped store, see query.py)
+    df = open_store(data_path).query(symbol, start_date, end_date, columns=PLOT_COLUMNS)
     df['x'] = df.index
 
     # plot price, volume histogram, MACD
@@ -28,17 +22,9 @@ def plot_candlestick_with_indicators(csv_file, symbol, start_date, end_date):
         gridspec_kw={'height_ratios': [3, 1, 1], 'hspace': 0.05}
     )
 
-    # Create candlesticks
+    # Create candlesticks (wicks and bodies drawn as one collection each)
     width = 0.6
-    for _, row in df.iterrows():
-        color = 'green' if row.close >= row.open else 'red'
-        # wick
-        ax_price.vlines(row.x, row.low, row.high, color=color, linewidth=1)
-        # body
-        bottom = min(row.open, row.close)
-        height = abs(row.close - row.open)
-        ax_price.bar(row.x, height, bottom=bottom,
-                     width=width, color=color, align='center')
+    draw_candles(ax_price, df.x, df['open'], df['high'], df['low'], df['close'], width=width)
 
     # Plot moving averages
     ax_price.plot(df.x, df['sma_7'],  label='SMA (7)',  linewidth=1.2)
@@ -74,12 +60,12 @@ def plot_candlestick_with_indicators(csv_file, symbol, start_date, end_date):
 
 if __name__ == '__main__':
     # ─── User parameters ───────────────────────
-    CSV_FILE   = 'stocks_with_indicators.csv'
+    DATA_PATH  = 'stocks_with_indicators.parquet'   # or a .csv / .arrow store
     SYMBOL     = 'MSFT'                   
     START_DATE = '2013-02-08'
     END_DATE   = '2018-02-07'
     # ───────────────────────────────────────────
 
     plot_candlestick_with_indicators(
-        CSV_FILE, SYMBOL, START_DATE, END_DATE
+        DATA_PATH, SYMBOL, START_DATE, END_DATE
     )
@@ -0,0 +1,169 @@
+# Array-based backtest engine for the buy-on-"buy" / exit-on-next-"sell" strategies.
+#
+# The panel is sorted once by (stock, date) and each stock is a (start, length)
+# slice of flat NumPy arrays. For every model column the index of the next "sell"
+# after each row comes from one reverse sweep (a running minimum from the end), so
+# finding the exit of a buy is a lookup instead of a forward scan with iloc. All
+# models x entry/exit combinations are then resolved with array operations and
+# produce the same trades, in the same order, as the original per-row loop.
+
+import numpy as np
+import pandas as pd
+
+ENTRY_EXIT = [('open', 'open'), ('open', 'close'), ('close', 'open'), ('close', 'close')]
+
+TRADE_COLUMNS = [
+    'strategy', 'stock', 'entry_date', 'exit_date',
+    'entry_type', 'entry_price',
+    'exit_type', 'exit_price',
+    'shares', 'profit'
+]
+SUMMARY_COLUMNS = ['strategy', 'total_profit', 'num_trades']
+
+
+def strategy_name(model_col, entry_type, exit_type):
+    return f"{model_col}_entry_{entry_type}_exit_{exit_type}"
+
+
+def prepare_panel(df, model_cols):
+    """Sort the price/signal frame once and pull out the arrays the engine needs.
+
+    Stocks keep the order in which they first appear in df (like df['stock'].unique()).
+    Signals are normalised the same way the original loop did: str(x).strip().lower().
+    """
+    codes, stocks = pd.factorize(df['stock'])
+    order = np.lexsort((df['date'].to_numpy(), codes))
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.zeros(0, dtype=np.int64)
+    lengths = np.diff(np.r_[starts, len(codes)])
+
+    panel = {
+        'stocks': np.asarray(stocks, dtype=object),
+        'codes': codes,
+        'starts': starts,
+        'lengths': lengths,
+        'dates': df['date'].to_numpy()[order],
+        'open': df['open'].to_numpy(dtype=np.float64)[order],
+        'close': df['close'].to_numpy(dtype=np.float64)[order],
+        'buy': {},
+        'sell': {},
+    }
+    for col in model_cols:
+        signal = df[col].astype(str).str.strip().str.lower().to_numpy()[order]
+        panel['buy'][col] = signal == 'buy'
+        panel['sell'][col] = signal == 'sell'
+    return panel
+
+
+def next_signal_index(is_signal, group_end):
+    """Index of the first flagged row strictly after each row, or -1 if none in its stock.
+
+    One reverse sweep: a running minimum of the flagged positions taken from the end.
+    """
+    n = len(is_signal)
+    flagged = np.where(is_signal, np.arange(n), n)
+    next_incl = np.minimum.accumulate(flagged[::-1])[::-1]
+    nxt = np.append(next_incl[1:], n)
+    return np.where(nxt < group_end, nxt, -1)
+
+
+def trades_per_budget(stock_budget, trade_size):
+    # the original loop subtracts trade_size from the budget per trade and stops once
+    # less than trade_size is left; replay that in floats so rounding matches exactly
+    remaining, count = stock_budget, 0
+    while remaining >= trade_size:
+        remaining -= trade_size
+        count += 1
+    return count
+
+
+def run_backtest(df, model_cols, portfolio_size=1_000_000.0, trade_fraction=0.20):
+    """Simulate every model x entry/exit strategy.
+
+    Each stock gets portfolio_size / num_stocks; every trade spends trade_fraction of
+    that and the budget is shared by the four entry/exit variants of a model (as in the
+    original portfolio.py). A buy exits at the next sell signal, or at the stock's last
+    row if there is none (or the sell row has no exit price).
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): the trade list (TRADE_COLUMNS) and the
+        per-strategy summary (SUMMARY_COLUMNS).
+    """
+    panel = prepare_panel(df, model_cols)
+    return backtest_panel(panel, model_cols, portfolio_size, trade_fraction)
+
+
+def backtest_panel(panel, model_cols, portfolio_size=1_000_000.0, trade_fraction=0.20):
+    """run_backtest on an already prepared panel (see prepare_panel). Only reads the arrays."""
+    n_stocks = len(panel['stocks'])
+    stock_budget = portfolio_size / n_stocks
+    trade_size = trade_fraction * stock_budget
+    max_trades = trades_per_budget(stock_budget, trade_size)
+
+    codes, starts, lengths = panel['codes'], panel['starts'], panel['lengths']
+    group_end = np.repeat(starts + lengths, lengths)
+    last_row = group_end - 1
+    prices = {'open': panel['open'], 'close': panel['close']}
+
+    trade_parts = []
+    summary_rows = []
+    for model_col in model_cols:
+        buy = panel['buy'][model_col]
+        next_sell = next_signal_index(panel['sell'][model_col], group_end)
+
+        # which buy rows become trades: eligible rows use up the stock's budget in
+        # (entry/exit variant, date) order until max_trades have been taken
+        variants = []
+        used = np.zeros(n_stocks, dtype=np.int64)
+        for entry_type, exit_type in ENTRY_EXIT:
+            entry_price = prices[entry_type]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                shares = np.floor(trade_size / entry_price)
+            eligible = buy & ~np.isnan(entry_price) & (shares >= 1)
+            rank = used[codes] + _group_cumcount(eligible, codes, starts)
+            taken = eligible & (rank < max_trades)
+            used += np.bincount(codes[taken], minlength=n_stocks)
+            variants.append((entry_type, exit_type, np.flatnonzero(taken), shares))
+
+        for entry_type, exit_type, rows, shares in variants:
+            exit_prices = prices[exit_type]
+            sell_at = next_sell[rows]
+            has_exit = sell_at >= 0
+            has_exit[has_exit] = ~np.isnan(exit_prices[sell_at[has_exit]])
+            exit_rows = np.where(has_exit, sell_at, last_row[rows])
+            exit_price = exit_prices[exit_rows]
+            # no usable sell: force-close on the last row, falling back to its close
+            fallback = ~has_exit & np.isnan(exit_price)
+            exit_price = np.where(fallback, panel['close'][exit_rows], exit_price)
+
+            entry_price = prices[entry_type][rows]
+            n_shares = shares[rows].astype(np.int64)
+            profit = n_shares * (exit_price - entry_price)
+
+            name = strategy_name(model_col, entry_type, exit_type)
+            trade_parts.append(pd.DataFrame({
+                'strategy': name,
+                'stock': panel['stocks'][codes[rows]],
+                'entry_date': pd.DatetimeIndex(panel['dates'][rows]).strftime('%Y-%m-%d'),
+                'exit_date': pd.DatetimeIndex(panel['dates'][exit_rows]).strftime('%Y-%m-%d'),
+                'entry_type': entry_type,
+                'entry_price': entry_price,
+                'exit_type': exit_type,
+                'exit_price': exit_price,
+                'shares': n_shares,
+                'profit': profit,
+            }, columns=TRADE_COLUMNS))
+            summary_rows.append({
+                'strategy': name,
+                'total_profit': float(sum(profit.tolist())),
+                'num_trades': int(len(rows)),
+            })
+
+    trades = pd.concat(trade_parts, ignore_index=True) if trade_parts else pd.DataFrame(columns=TRADE_COLUMNS)
+    return trades, pd.DataFrame(summary_rows, columns=SUMMARY_COLUMNS)
+
+
+def _group_cumcount(mask, codes, starts):
+    # number of True entries of mask before each row within the same stock
+    csum = np.cumsum(mask) - mask
+    return csum - csum[starts][codes]
@@ -0,0 +1,118 @@
+# Cumulative P&L curves from a trade list (the trade_list.csv written by portfolio.py).
+#
+# A curve is a cumulative sum of events evaluated at query dates: +profit on a trade's
+# exit date for realized P&L, +shares / +cost on its entry date and the opposite on
+# its exit date for the open position that is marked to market. Events are sorted
+# once, cumulated, and every (stock, date) query is a single searchsorted into that
+# cumulative array, so a whole price panel is done in O(n log n) instead of one
+# filter-and-sum per date.
+
+import numpy as np
+import pandas as pd
+
+
+def _keys(codes, dates, n_dates):
+    return codes.astype(np.int64) * n_dates + dates
+
+
+def cumulative_at(event_codes, event_dates, event_values, query_codes, query_dates):
+    """Sum of event_values with the same code and event date <= query date, per query.
+
+    Codes are integer group ids (e.g. factorized tickers); use all zeros for a
+    portfolio-wide curve. Dates may be anything np.unique can order (datetime64).
+    """
+    event_values = np.asarray(event_values, dtype=np.float64)
+    all_dates, ranks = np.unique(np.concatenate([np.asarray(event_dates), np.asarray(query_dates)]),
+                                 return_inverse=True)
+    n_events = len(event_values)
+    event_keys = _keys(np.asarray(event_codes), ranks[:n_events], len(all_dates))
+    query_keys = _keys(np.asarray(query_codes), ranks[n_events:], len(all_dates))
+
+    order = np.argsort(event_keys, kind='stable')
+    sorted_keys = event_keys[order]
+    csum = np.r_[0.0, np.cumsum(event_values[order])]
+
+    # everything before (code, date] minus everything before the code's first event
+    upto = np.searchsorted(sorted_keys, query_keys, side='right')
+    group_start = np.searchsorted(sorted_keys, _keys(np.asarray(query_codes), 0, len(all_dates)), side='left')
+    return csum[upto] - csum[group_start]
+
+
+def _trade_arrays(trades):
+    return (
+        pd.to_datetime(trades['entry_date']).to_numpy(dtype='datetime64[ns]'),
+        pd.to_datetime(trades['exit_date']).to_numpy(dtype='datetime64[ns]'),
+        trades['shares'].to_numpy(dtype=np.float64),
+    )
+
+
+def _codes(trades, prices):
+    # shared integer ids for the tickers of both tables
+    stocks = pd.Index(pd.unique(np.concatenate([
+        trades['stock'].astype(str).to_numpy(), prices['stock'].astype(str).to_numpy()])))
+    return (stocks.get_indexer(trades['stock'].astype(str)),
+            stocks.get_indexer(prices['stock'].astype(str)))
+
+
+def realized_pnl(trades, dates):
+    """Portfolio realized P&L on each date: profit of every trade with exit_date <= date."""
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ns]')
+    _, exit_dates, _ = _trade_arrays(trades)
+    return cumulative_at(np.zeros(len(trades), dtype=np.int64), exit_dates, trades['profit'].to_numpy(),
+                         np.zeros(len(dates), dtype=np.int64), dates)
+
+
+def stock_realized_pnl(trades, prices):
+    """Realized P&L of each price row's own stock up to that row's date.
+
+    Args:
+        trades (pd.DataFrame): trade list with stock, exit_date and profit.
+        prices (pd.DataFrame): one row per (stock, date).
+
+    Returns:
+        np.ndarray aligned with the rows of prices.
+    """
+    trade_codes, price_codes = _codes(trades, prices)
+    _, exit_dates, _ = _trade_arrays(trades)
+    return cumulative_at(trade_codes, exit_dates, trades['profit'].to_numpy(),
+                         price_codes, prices['date'].to_numpy(dtype='datetime64[ns]'))
+
+
+def stock_unrealized_pnl(trades, prices):
+    """Mark-to-market P&L of the positions open at each price row's close.
+
+    A trade is open from its entry date up to, but not including, its exit date
+    (on the exit date its profit is realized). The value is
+    open_shares * close - cost of the open shares, aligned with the rows of prices.
+    """
+    trade_codes, price_codes = _codes(trades, prices)
+    entry_dates, exit_dates, shares = _trade_arrays(trades)
+    cost = shares * trades['entry_price'].to_numpy(dtype=np.float64)
+
+    event_codes = np.r_[trade_codes, trade_codes]
+    event_dates = np.r_[entry_dates, exit_dates]
+    query_dates = prices['date'].to_numpy(dtype='datetime64[ns]')
+    open_shares = cumulative_at(event_codes, event_dates, np.r_[shares, -shares], price_codes, query_dates)
+    open_cost = cumulative_at(event_codes, event_dates, np.r_[cost, -cost], price_codes, query_dates)
+    # nan closes would otherwise poison the flat stretches with no open position
+    close = np.nan_to_num(prices['close'].to_numpy(dtype=np.float64))
+    return open_shares * close - open_cost
+
+
+def equity_curve(trades, prices):
+    """Daily portfolio P&L: realized, unrealized (marked at each stock's close) and total.
+
+    Unrealized P&L on a date sums the price rows that exist for that date, so a stock
+    with an open position but no row that day does not contribute.
+
+    Returns:
+        pd.DataFrame indexed by date with columns realized, unrealized and total.
+    """
+    dates, date_ids = np.unique(prices['date'].to_numpy(dtype='datetime64[ns]'), return_inverse=True)
+    unrealized = np.bincount(date_ids, weights=stock_unrealized_pnl(trades, prices), minlength=len(dates))
+    realized = realized_pnl(trades, dates)
+    return pd.DataFrame({
+        'realized': realized,
+        'unrealized': unrealized,
+        'total': realized + unrealized,
+    }, index=pd.DatetimeIndex(dates, name='date'))
@@ -0,0 +1,98 @@
+# Attach model prediction columns to the selected (stock, date) rows without a
+# pandas merge per model.
+#
+# Every row is reduced to one int64 key: (stock code << 32) | day number. The base
+# table's keys are computed once; each prediction source is sorted by its own keys
+# and aligned to the base with a single searchsorted, so adding a model is one
+# O(m log m) sort of that model's rows instead of another full-table merge.
+
+import numpy as np
+import pandas as pd
+
+DUPLICATE_POLICIES = ('first', 'last', 'error')
+_DAY_OFFSET = 1 << 31  # keeps pre-1970 day numbers positive
+
+
+def date_days(dates):
+    """Dates as int64 day numbers (days since 1970-01-01)."""
+    return pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+
+def row_keys(stocks, dates, stock_index):
+    """int64 (stock, date) keys; stocks missing from stock_index get -1."""
+    codes = stock_index.get_indexer(pd.Index(np.asarray(stocks, dtype=str)))
+    keys = (codes.astype(np.int64) << 32) | (date_days(dates) + _DAY_OFFSET)
+    return np.where(codes >= 0, keys, -1)
+
+
+def _unique_rows(keys, on_duplicate, what):
+    # positions of the rows to keep, one per distinct key, sorted by key
+    if on_duplicate not in DUPLICATE_POLICIES:
+        raise ValueError(f"on_duplicate must be one of {DUPLICATE_POLICIES}, got '{on_duplicate}'")
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    new_key = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+    n_dup = int(len(keys) - new_key.sum())
+    if n_dup and on_duplicate == 'error':
+        raise ValueError(f"{what}: {n_dup} duplicate (stock, date) rows")
+    if on_duplicate == 'last':
+        keep = np.r_[new_key[1:], True] if len(keys) else new_key
+    else:
+        keep = new_key
+    return order[keep], n_dup
+
+
+class LabelMerger:
+    """Base (stock, date) rows plus any number of attached prediction columns.
+
+    Args:
+        base (pd.DataFrame): rows to keep, with stock and date columns.
+        on_duplicate (str): 'first', 'last' or 'error' for repeated (stock, date)
+            rows, in the base and in every source.
+    """
+
+    def __init__(self, base, on_duplicate='first'):
+        self.on_duplicate = on_duplicate
+        self.stock_index = pd.Index(np.sort(base['stock'].astype(str).unique()))
+        keys = row_keys(base['stock'].astype(str), base['date'], self.stock_index)
+        rows, n_dup = _unique_rows(keys, on_duplicate, 'base')
+        if n_dup:
+            print(f"Base: {n_dup} duplicate (stock, date) rows, kept the {on_duplicate}")
+        # keep the base in its original row order
+        rows = np.sort(rows)
+        self.base = base.iloc[rows].reset_index(drop=True)
+        self.keys = keys[rows]
+        self.columns = {}
+
+    def attach(self, source, columns, name='source'):
+        """Align columns of source to the base rows (missing -> NaN).
+
+        Returns:
+            int: how many base rows got a value from this source.
+        """
+        clash = [c for c in columns if c in self.base.columns or c in self.columns]
+        if clash:
+            raise ValueError(f"{name}: columns {clash} are already present")
+
+        keys = row_keys(source['stock'].astype(str), source['date'], self.stock_index)
+        rows, n_dup = _unique_rows(keys, self.on_duplicate, name)
+        if n_dup:
+            print(f"{name}: {n_dup} duplicate (stock, date) rows, kept the {self.on_duplicate}")
+        rows = rows[keys[rows] >= 0]
+        src_keys = keys[rows]
+
+        pos = np.searchsorted(src_keys, self.keys)
+        pos_clipped = np.minimum(pos, max(len(src_keys) - 1, 0))
+        found = (pos < len(src_keys)) & (src_keys[pos_clipped] == self.keys) if len(src_keys) else np.zeros(len(self.keys), dtype=bool)
+        take = rows[pos_clipped[found]]
+
+        for col in columns:
+            values = source[col].to_numpy()
+            out = np.full(len(self.keys), np.nan, dtype=np.float64 if values.dtype.kind in 'fiub' else object)
+            out[found] = values[take]
+            self.columns[col] = out
+        return int(found.sum())
+
+    def frame(self):
+        """The base rows with every attached column."""
+        return pd.concat([self.base, pd.DataFrame(self.columns)], axis=1)
@@ -1,67 +1,66 @@
 # merge.py
 
 import os
-import pandas as pd
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from storage import read_table, write_arrow
+from instrument import span
+from nn_inference import MODEL_FILES, TRAINING_DATA, add_predictions, training_stocks
+from label_merge import LabelMerger
+
+# Extra prediction files to attach: (path, [columns]). Each one is aligned to the
+# selected rows by (stock, date) key, no extra table merge per model.
+EXTRA_SOURCES = [
+    # ('predicted_lgbm.csv', ['lgbm3', 'lgbm7']),
+]
+
+# What to do with repeated (stock, date) rows in the selected data or a source:
+# 'first' / 'last' keeps that row, 'error' stops
+ON_DUPLICATE = 'first'
+
 
 def main():
     # File paths
     selected_data_path = 'selected_data_completed.csv'
-    nn3_path           = 'predicted_weighted_test_label3.csv'
-    nn7_path           = 'predicted_weighted_testing_label7.csv'
+    features_path      = 'selected_data.csv'
+    nn3_path, _        = MODEL_FILES['nn3']
+    nn7_path, _        = MODEL_FILES['nn7']
 
     # File verification
-    for p in (selected_data_path, nn3_path, nn7_path):
+    # training_data.csv gives the tickers the nn models encode as stock_id
+    for p in ((selected_data_path, features_path, TRAINING_DATA, nn3_path, nn7_path)
+              + tuple(p for p, _ in EXTRA_SOURCES)):
         if not os.path.isfile(p):
             raise SystemExit(f"Error: '{p}' not found. Place it alongside this script.")
 
-    # Load and parse date
-    df_sel = pd.read_csv(selected_data_path, parse_dates=['date'])
-    
-    # Drop duplicates in selected data if any
-    df_sel = df_sel.drop_duplicates(subset=['stock', 'date'], keep='first')
-    print(f"Selected data shape after dropping duplicates: {df_sel.shape}")
-
-    # Load test3 and extract only (stock, date, predicted_label_3)
-    df_nn3 = pd.read_csv(nn3_path, parse_dates=['date'])
-    df_nn3 = df_nn3[['stock', 'date', 'nn3']]
-    
-    # Drop duplicates in nn3 data if any
-    df_nn3 = df_nn3.drop_duplicates(subset=['stock', 'date'], keep='first')
-    print(f"NN3 data shape after dropping duplicates: {df_nn3.shape}")
-
-    # Load test7 and extract only (stock, date, predicted_label_7)
-    df_nn7 = pd.read_csv(nn7_path, parse_dates=['date'])
-    df_nn7 = df_nn7[['stock', 'date', 'nn7']]
-    
-    # Drop duplicates in nn7 data if any
-    df_nn7 = df_nn7.drop_duplicates(subset=['stock', 'date'], keep='first')
-    print(f"NN7 data shape after dropping duplicates: {df_nn7.shape}")
+    # Load and parse date (xg3 / xg7 / log3 / log7 are already columns of the selected data)
+    with span('read_selected') as s:
+        merger = LabelMerger(read_table(selected_data_path), on_duplicate=ON_DUPLICATE)
+        s.rows = len(merger.base)
+    print(f"Selected data shape after dropping duplicates: {merger.base.shape}")
 
-    # Merge nn3 labels
-    df_merged = pd.merge(
-        df_sel,
-        df_nn3,
-        on=['stock', 'date'],
-        how='left'  # use left join so we keep all original rows (even if NN has no label)
-    )
+    # Score the same rows with the saved nn3 / nn7 models (no predicted_*.csv round trip)
+    with span('read_features') as s:
+        df_features = read_table(features_path)
+        s.rows = len(df_features)
+    with span('nn_predictions', rows=len(df_features)):
+        df_nn = add_predictions(df_features, training_stocks())
+    with span('attach_nn', rows=len(df_nn)):
+        matched = merger.attach(df_nn, ['nn3', 'nn7'], name='nn')
+    print(f"NN labels attached to {matched} rows")
 
-    # Merge nn7 labels
-    df_merged = pd.merge(
-        df_merged,
-        df_nn7,
-        on=['stock', 'date'],
-        how='left'
-    )
+    for path, columns in EXTRA_SOURCES:
+        with span(f'attach:{path}'):
+            matched = merger.attach(read_table(path, columns=columns), columns, name=path)
+        print(f"{columns} from '{path}' attached to {matched} rows")
 
-    # Check for duplicates in final merged data
-    duplicates = df_merged.duplicated(subset=['stock', 'date'], keep=False)
-    if duplicates.any():
-        print(f"Warning: Found {duplicates.sum()} duplicate rows in merged data. Dropping duplicates...")
-        df_merged = df_merged.drop_duplicates(subset=['stock', 'date'], keep='first')
+    df_merged = merger.frame()
 
-    # Save to new csv
-    output_path = 'selected_data_with_nn.csv'
-    df_merged.to_csv(output_path, index=False)
+    # Save as one memory-mappable Arrow file (read by portfolio.py / portfolio_graphs.py)
+    output_path = 'selected_data_with_nn.arrow'
+    with span('write', rows=len(df_merged)):
+        write_arrow(df_merged, output_path)
     print(f"Merged file written to '{output_path}'")
     print(f"Final merged data shape: {df_merged.shape}")
 
@@ -0,0 +1,141 @@
+# Parameter sweep over the backtest: every (model, trade_fraction, portfolio_size)
+# combination of the grid runs the four entry/exit variants of backtest.py.
+#
+# The price / signal panel is prepared once in the parent and copied into shared
+# memory blocks; worker processes attach to those blocks as read-only NumPy views
+# instead of receiving a pickled DataFrame per task. Results come back in grid
+# order, so the merged trade list / summary does not depend on the worker count.
+
+import argparse
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from storage import read_table
+from backtest import SUMMARY_COLUMNS, TRADE_COLUMNS, backtest_panel, prepare_panel
+from instrument import span
+
+GRID_COLUMNS = ['model', 'trade_fraction', 'portfolio_size']
+PANEL_ARRAYS = ['codes', 'starts', 'lengths', 'dates', 'open', 'close']
+
+# set in each worker by _attach_panel
+_panel = None
+_blocks = []
+
+
+def make_grid(model_cols, trade_fractions=(0.20,), portfolio_sizes=(1_000_000.0,)):
+    """All (model, trade_fraction, portfolio_size) combinations, as a list of dicts."""
+    return [
+        {'model': model, 'trade_fraction': float(fraction), 'portfolio_size': float(size)}
+        for model, fraction, size in itertools.product(model_cols, trade_fractions, portfolio_sizes)
+    ]
+
+
+def _share_panel(panel, model_cols):
+    # copy every array of the panel into its own shared memory block;
+    # descriptors are (block name, shape, dtype) and are all a worker needs
+    arrays = {key: panel[key] for key in PANEL_ARRAYS}
+    for col in model_cols:
+        arrays[f'buy:{col}'] = panel['buy'][col]
+        arrays[f'sell:{col}'] = panel['sell'][col]
+
+    blocks, descriptors = [], {}
+    for key, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)[...] = arr
+        blocks.append(block)
+        descriptors[key] = (block.name, arr.shape, arr.dtype.str)
+    return blocks, descriptors
+
+
+def _attach_panel(descriptors, stocks):
+    # pool initializer: rebuild the panel dict from views on the shared blocks
+    global _panel
+    panel = {'stocks': stocks, 'buy': {}, 'sell': {}}
+    for key, (name, shape, dtype) in descriptors.items():
+        block = shared_memory.SharedMemory(name=name)
+        _blocks.append(block)
+        arr = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        arr.flags.writeable = False
+        kind, _, col = key.partition(':')
+        if col:
+            panel[kind][col] = arr
+        else:
+            panel[key] = arr
+    _panel = panel
+
+
+def _run_spec(spec):
+    trades, summary = backtest_panel(_panel, [spec['model']], spec['portfolio_size'], spec['trade_fraction'])
+    for col in GRID_COLUMNS[1:]:
+        trades[col] = spec[col]
+        summary[col] = spec[col]
+    return trades, summary
+
+
+def run_sweep(df, grid, max_workers=None):
+    """Backtest every grid entry over one shared panel.
+
+    Args:
+        df (pd.DataFrame): price / signal frame (stock, date, open, close and the model columns).
+        grid (list): dicts with GRID_COLUMNS keys, e.g. from make_grid.
+        max_workers (int): worker processes; None uses os.cpu_count().
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): trades and summaries of all grid entries, in grid
+        order, with trade_fraction / portfolio_size columns added.
+    """
+    model_cols = list(dict.fromkeys(spec['model'] for spec in grid))
+    panel = prepare_panel(df, model_cols)
+    blocks, descriptors = _share_panel(panel, model_cols)
+    try:
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(grid) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_panel,
+                                 initargs=(descriptors, panel['stocks'])) as pool:
+            results = list(pool.map(_run_spec, grid, chunksize=chunksize))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    extra = GRID_COLUMNS[1:]
+    if not results:
+        return pd.DataFrame(columns=TRADE_COLUMNS + extra), pd.DataFrame(columns=SUMMARY_COLUMNS + extra)
+    trades = pd.concat([trades for trades, _ in results], ignore_index=True)
+    summary = pd.concat([summary for _, summary in results], ignore_index=True)
+    return trades, summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backtest a grid of portfolio parameters in parallel.')
+    parser.add_argument('--models', nargs='+', default=['xg3', 'xg7', 'nn3', 'nn7'])
+    parser.add_argument('--trade-fractions', nargs='+', type=float, default=[0.10, 0.20, 0.25, 0.50])
+    parser.add_argument('--portfolio-sizes', nargs='+', type=float, default=[1_000_000.0])
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    data_path = 'selected_data_with_nn.arrow'
+    if not os.path.exists(data_path):
+        raise SystemExit(f"Error: '{data_path}' not found. Place it alongside this script.")
+
+    with span('read') as s:
+        df = read_table(data_path)
+        s.rows = len(df)
+    grid = make_grid(args.models, args.trade_fractions, args.portfolio_sizes)
+    with span('sweep', rows=len(df) * len(grid)):
+        trade_df, summary_df = run_sweep(df, grid, args.workers)
+
+    out_dir = 'portfolio_details'
+    os.makedirs(out_dir, exist_ok=True)
+    trade_df.to_csv(os.path.join(out_dir, 'sweep_trade_list.csv'), index=False)
+    summary_df.to_csv(os.path.join(out_dir, 'sweep_summary.csv'), index=False)
+    print(f"→ Ran {len(grid)} parameter sets, {len(trade_df)} trades written to '{out_dir}'")
+    print(summary_df.to_string(index=False))
@@ -0,0 +1,252 @@
+# Streak and agreement statistics of the buy / hold / sell columns of the merged
+# (stock, date) signal data (label_3 / label_7 and the xg / log / nn predictions).
+#
+# The frame is sorted once by (stock, date) and every signal column becomes integer
+# codes. A run starts wherever the stock or the code changes, so one flatnonzero
+# gives the run-length encoding of a column for every ticker at once; run lengths
+# are differences of the run starts. Longest streaks, flip rates and model
+# agreement are then bincounts / sorts over those arrays, with no per-ticker loop.
+# Rows without a signal (NaN, e.g. no nn prediction) break a run and are not
+# counted as a streak themselves.
+#
+# Without a signal column, a streak is a stock's presence streak: its rows on
+# consecutive trading days of the data's date calendar (the sorted dates of all
+# rows), cut wherever the stock misses a day. The script writes these to
+# top10_longest_streaks.csv at the repo root. The copy of that file in the repo
+# counted every row of a stock as one streak, with no gap check, so it differs
+# where a stock misses a day: on selected_data.csv, CRM has 31 rows but a longest
+# streak of 25 (no 2016-09-07 row). Signal streaks go to
+# portfolio_details/top<k>_<column>_streaks.csv, with the same columns but a
+# different meaning.
+#
+# Usage:
+#   python portfolio_code/signal_stats.py                           # presence + label_3 streaks, top 10
+#   python portfolio_code/signal_stats.py --streak-column xg7 --value buy --top 20
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from storage import read_table
+from instrument import span
+
+SIGNAL_COLUMNS = ['label_3', 'label_7', 'xg3', 'xg7', 'log3', 'log7', 'nn3', 'nn7']
+MODEL_GROUPS = {3: ['xg3', 'log3', 'nn3'], 7: ['xg7', 'log7', 'nn7']}
+STREAK_COLUMNS = ['stock', 'longest_streak', 'start_date', 'end_date']
+STATS_COLUMNS = ['stock', 'signal', 'rows', 'runs', 'flips', 'flip_rate', 'mean_streak', 'longest_streak']
+
+
+def _signal_codes(series):
+    # integer code per row (-1 = no signal) and the signal each code stands for;
+    # values are normalised like backtest.prepare_panel (str(x).strip().lower())
+    values = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    names = pd.Index(values.cat.categories.astype(str).str.strip().str.lower())
+    labels, remap = np.unique(names.to_numpy(dtype=object), return_inverse=True)
+    cat_codes = values.cat.codes.to_numpy()
+    codes = np.where(cat_codes >= 0, remap[np.maximum(cat_codes, 0)], -1)
+    return codes.astype(np.int64), labels
+
+
+class SignalPanel:
+    """The signal columns of a (stock, date) frame, sorted once, as integer codes.
+
+    Args:
+        df (pd.DataFrame): merged signal data with stock, date and signal columns.
+        columns (list): signal columns to encode (those missing from df are skipped).
+    """
+
+    def __init__(self, df, columns=SIGNAL_COLUMNS):
+        codes, stocks = pd.factorize(df['stock'])
+        order = np.lexsort((df['date'].to_numpy(), codes))
+        self.stocks = np.asarray(stocks, dtype=object)
+        self.stock_codes = codes[order]
+        self.dates = df['date'].to_numpy()[order]
+        # position of each row's date on the panel's calendar (its sorted unique dates)
+        self.date_ids = np.unique(self.dates, return_inverse=True)[1].ravel()
+        self.columns = [c for c in columns if c in df.columns]
+        self.signals, self.labels = {}, {}
+        for col in self.columns:
+            self.signals[col], self.labels[col] = _signal_codes(df[col])
+            self.signals[col] = self.signals[col][order]
+
+    def runs(self, column=None):
+        """Run-length encoding of column within every stock.
+
+        With column None the runs are presence streaks (signal code 0): a stock's rows
+        on consecutive dates of the panel's calendar, cut where the stock misses one.
+
+        Returns:
+            dict of arrays, one entry per run: stock (code), signal (code, -1 for
+            rows without a signal), start (row), length.
+        """
+        n = len(self.stock_codes)
+        signal = self.signals[column] if column is not None else np.zeros(n, dtype=np.int64)
+        if n == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return {'stock': empty, 'signal': empty, 'start': empty, 'length': empty}
+        change = (self.stock_codes[1:] != self.stock_codes[:-1]) | (signal[1:] != signal[:-1])
+        if column is None:
+            change |= self.date_ids[1:] != self.date_ids[:-1] + 1
+        change = np.r_[True, change]
+        starts = np.flatnonzero(change)
+        return {
+            'stock': self.stock_codes[starts],
+            'signal': signal[starts],
+            'start': starts,
+            'length': np.diff(np.r_[starts, n]),
+        }
+
+    def longest_streaks(self, column=None, value=None, k=10):
+        """The k stocks with the longest streak of one signal in column.
+
+        Args:
+            column (str): signal column, e.g. 'label_3' or 'xg7'; None = presence
+                streaks, a stock's rows on consecutive trading days (top10_longest_streaks.csv).
+            value (str): only count streaks of this signal ('buy', ...); None = any.
+                Ignored for presence streaks.
+            k (int): number of stocks; None = all of them.
+
+        Returns:
+            pd.DataFrame with STREAK_COLUMNS, longest first. A stock's earliest
+            streak wins a tie within the stock; ties between stocks keep stock order.
+        """
+        runs = self.runs(column)
+        keep = runs['signal'] >= 0
+        if value is not None and column is not None:
+            match = np.flatnonzero(self.labels[column] == value.strip().lower())
+            keep &= runs['signal'] == (match[0] if len(match) else -2)
+        stock, start, length = runs['stock'][keep], runs['start'][keep], runs['length'][keep]
+
+        # best run of every stock: sort by (stock, -length, start), first of each stock
+        order = np.lexsort((start, -length, stock))
+        first = order[np.r_[True, stock[order][1:] != stock[order][:-1]]] if len(order) else order
+        # then stocks by -length (stable, so stock order breaks ties)
+        best = first[np.argsort(-length[first], kind='stable')][:k]
+        return pd.DataFrame({
+            'stock': self.stocks[stock[best]],
+            'longest_streak': length[best],
+            'start_date': pd.DatetimeIndex(self.dates[start[best]]).strftime('%Y-%m-%d'),
+            'end_date': pd.DatetimeIndex(self.dates[start[best] + length[best] - 1]).strftime('%Y-%m-%d'),
+        }, columns=STREAK_COLUMNS)
+
+    def signal_stats(self):
+        """Per stock and signal column: rows, runs, flips, flip rate and streak lengths.
+
+        Only rows with a signal count. A flip is a change of signal between two
+        consecutive signalled rows of the stock; flip_rate is flips per transition.
+        """
+        n_stocks = len(self.stocks)
+        frames = []
+        for col in self.columns:
+            runs = self.runs(col)
+            has = runs['signal'] >= 0
+            stock, signal, length = runs['stock'][has], runs['signal'][has], runs['length'][has]
+            rows = np.bincount(stock, weights=length, minlength=n_stocks).astype(np.int64)
+            n_runs = np.bincount(stock, minlength=n_stocks)
+            # consecutive signalled runs of the same stock with different signals
+            same_stock = stock[1:] == stock[:-1]
+            flips = np.bincount(stock[1:][same_stock & (signal[1:] != signal[:-1])], minlength=n_stocks)
+            longest = np.zeros(n_stocks, dtype=np.int64)
+            np.maximum.at(longest, stock, length)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                frames.append(pd.DataFrame({
+                    'stock': self.stocks,
+                    'signal': col,
+                    'rows': rows,
+                    'runs': n_runs,
+                    'flips': flips,
+                    'flip_rate': flips / np.maximum(rows - 1, 0),
+                    'mean_streak': rows / n_runs,
+                    'longest_streak': longest,
+                }, columns=STATS_COLUMNS))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=STATS_COLUMNS)
+
+    def model_agreement(self, groups=MODEL_GROUPS):
+        """Per stock and horizon: how often each pair of models gives the same signal.
+
+        Columns are named by model family (xg3 / xg7 -> xg), so both horizons share
+        them: <a>_<b> for each pair, all_agree for every model of the horizon, and
+        <model>_label for agreement with label_<horizon> when that column is present.
+        A rate only counts the rows where all of the compared columns have a signal.
+        """
+        n_stocks = len(self.stocks)
+        frames = []
+        for horizon, models in groups.items():
+            models = [m for m in models if m in self.signals]
+            if not models:
+                continue
+            label = f'label_{horizon}'
+            codes = self._shared_codes(models + ([label] if label in self.signals else []))
+            family = {m: m.rstrip('0123456789') for m in models}
+            out = {'stock': self.stocks, 'horizon': horizon}
+            every = np.ones(len(self.stock_codes), dtype=bool)
+            all_same = np.ones(len(self.stock_codes), dtype=bool)
+            for i, a in enumerate(models):
+                every &= codes[a] >= 0
+                all_same &= codes[a] == codes[models[0]]
+                for b in models[i + 1:]:
+                    out[f'{family[a]}_{family[b]}'] = self._rate(codes[a] == codes[b],
+                                                                 (codes[a] >= 0) & (codes[b] >= 0), n_stocks)
+            out['all_agree'] = self._rate(all_same, every, n_stocks)
+            if label in codes:
+                for m in models:
+                    out[f'{family[m]}_label'] = self._rate(codes[m] == codes[label],
+                                                           (codes[m] >= 0) & (codes[label] >= 0), n_stocks)
+            frames.append(pd.DataFrame(out))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['stock', 'horizon'])
+
+    def _shared_codes(self, columns):
+        # codes of several columns in one label space, so they compare as integers
+        shared = np.unique(np.concatenate([self.labels[c] for c in columns]))
+        return {c: np.where(self.signals[c] >= 0,
+                            np.searchsorted(shared, self.labels[c])[np.maximum(self.signals[c], 0)], -1)
+                for c in columns}
+
+    def _rate(self, agree, valid, n_stocks):
+        hits = np.bincount(self.stock_codes[valid & agree], minlength=n_stocks)
+        total = np.bincount(self.stock_codes[valid], minlength=n_stocks)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return hits / total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Signal streaks, flip rates and model agreement per ticker.')
+    parser.add_argument('--data', default='selected_data_with_nn.arrow')
+    parser.add_argument('--streak-column', default='label_3')
+    parser.add_argument('--value', default=None, help='only streaks of this signal (buy / hold / sell)')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        raise SystemExit(f"Error: '{args.data}' not found. Place it alongside this script.")
+
+    with span('read') as s:
+        df = read_table(args.data)
+        s.rows = len(df)
+    with span('encode', rows=len(df)):
+        panel = SignalPanel(df)
+    if args.streak_column not in panel.columns:
+        raise SystemExit(f"Error: no '{args.streak_column}' column in '{args.data}'; columns are {panel.columns}")
+
+    with span('analytics', rows=len(df)):
+        presence = panel.longest_streaks(None, k=args.top)
+        streaks = panel.longest_streaks(args.streak_column, args.value, args.top)
+        stats = panel.signal_stats()
+        agreement = panel.model_agreement()
+
+    out_dir = 'portfolio_details'
+    os.makedirs(out_dir, exist_ok=True)
+    presence_csv = f'top{args.top}_longest_streaks.csv'
+    value_suffix = f'_{args.value.strip().lower()}' if args.value else ''
+    streak_csv = f'top{args.top}_{args.streak_column}{value_suffix}_streaks.csv'
+    presence.to_csv(presence_csv, index=False)
+    streaks.to_csv(os.path.join(out_dir, streak_csv), index=False)
+    stats.to_csv(os.path.join(out_dir, 'signal_stats.csv'), index=False)
+    agreement.to_csv(os.path.join(out_dir, 'model_agreement.csv'), index=False)
+    print(streaks.to_string(index=False))
+    print(f"→ Wrote presence streaks to '{presence_csv}', and {streak_csv} / signal_stats.csv / "
+          f"model_agreement.csv to '{out_dir}'")
@@ -0,0 +1,272 @@
+# Portfolio-level simulation of the model signals with daily accounting.
+#
+# backtest.py reproduces the original trade list: every stock gets a fixed budget
+# that is never replenished when a trade exits, and the four entry/exit variants of
+# a model draw on the same budget. Here every model x entry/exit strategy is its own
+# portfolio with one cash balance, and exits return their proceeds to that cash, so
+# capital is recycled across stocks and over time.
+#
+# The panel becomes dates x tickers matrices (open, close, buy / sell per model).
+# The simulation steps through the dates once. Each step is a handful of NumPy
+# operations on (strategy x ticker) arrays, so all strategies move together:
+#   1. sell signals close the whole position in that stock at the exit price
+#   2. buy signals add a lot of trade_fraction * (NAV / n_stocks) at the entry price,
+#      as long as the position stays within NAV / n_stocks; when the buys of a
+#      session cost more than the cash on hand they are all scaled down
+#   Steps 1 and 2 run for the open and then for the close, each strategy filling at
+#   its own entry / exit price. The fills follow the day's order: a sale at the
+#   close cannot fund that morning's buy at the open.
+#   3. on a stock's last row anything still held is sold at the close
+#   4. positions are marked at the close (the last known close when a stock has no
+#      row that day) for NAV, cash and exposure
+# Fills pay slippage (buys fill above, sells below the quoted price) and a
+# transaction cost on their notional. Drawdown is taken from the daily NAV.
+#
+# Usage:
+#   python portfolio_code/simulator.py
+#   python portfolio_code/simulator.py --models xg3 nn3 --cost-bps 10 --slippage-bps 5
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+from storage import read_table
+from backtest import ENTRY_EXIT, prepare_panel, strategy_name
+from instrument import span
+
+PRICE_TYPES = ['open', 'close']
+DAILY_COLUMNS = ['date', 'strategy', 'nav', 'cash', 'invested', 'exposure', 'drawdown', 'positions']
+FILL_COLUMNS = ['strategy', 'stock', 'date', 'side', 'shares', 'price', 'notional', 'cost']
+SUMMARY_COLUMNS = ['strategy', 'final_nav', 'total_return', 'max_drawdown', 'mean_exposure',
+                   'num_buys', 'num_sells', 'total_cost']
+
+
+def panel_matrices(panel, model_cols):
+    """Dates x tickers matrices of a prepared panel (see backtest.prepare_panel).
+
+    Returns:
+        dict: dates (sorted unique), prices (2 x dates x tickers, open then close,
+        nan where a stock has no row), buy / sell (models x dates x tickers bool) and
+        last (dates x tickers, True on each stock's last row).
+    """
+    dates, date_ids = np.unique(panel['dates'], return_inverse=True)
+    codes = panel['codes']
+    shape = (len(dates), len(panel['stocks']))
+
+    prices = np.full((len(PRICE_TYPES),) + shape, np.nan)
+    for i, price_type in enumerate(PRICE_TYPES):
+        prices[i, date_ids, codes] = panel[price_type]
+    buy = np.zeros((len(model_cols),) + shape, dtype=bool)
+    sell = np.zeros_like(buy)
+    for i, col in enumerate(model_cols):
+        buy[i, date_ids, codes] = panel['buy'][col]
+        sell[i, date_ids, codes] = panel['sell'][col]
+    last = np.zeros(shape, dtype=bool)
+    last_rows = panel['starts'] + panel['lengths'] - 1
+    last[date_ids[last_rows], codes[last_rows]] = True
+    return {'dates': dates, 'prices': prices, 'buy': buy, 'sell': sell, 'last': last}
+
+
+def simulate(df, model_cols, portfolio_size=1_000_000.0, trade_fraction=0.20, cost_bps=5.0,
+             slippage_bps=5.0, keep_positions=False):
+    """Simulate every model x entry/exit strategy as a separate portfolio.
+
+    Args:
+        df (pd.DataFrame): price / signal frame (stock, date, open, close and the model columns).
+        model_cols (list): signal columns with buy / hold / sell values.
+        portfolio_size (float): starting cash of each strategy.
+        trade_fraction (float): one buy is this fraction of a stock's share of NAV.
+        cost_bps (float): transaction cost per fill, in basis points of its notional.
+        slippage_bps (float): adverse price move per fill, in basis points.
+        keep_positions (bool): also return the shares held at every close.
+
+    Returns:
+        dict: daily (DAILY_COLUMNS, one row per date and strategy), fills (FILL_COLUMNS),
+        summary (SUMMARY_COLUMNS) and, with keep_positions, positions (dates x
+        strategies x tickers array of shares) with strategies and stocks labelling it.
+    """
+    panel = prepare_panel(df, model_cols)
+    m = panel_matrices(panel, model_cols)
+    combos = [(i, col, entry_type, exit_type)
+              for i, col in enumerate(model_cols) for entry_type, exit_type in ENTRY_EXIT]
+    names = [strategy_name(col, entry_type, exit_type) for _, col, entry_type, exit_type in combos]
+    model_idx = np.array([i for i, _, _, _ in combos], dtype=np.int64)
+    entry_idx = np.array([PRICE_TYPES.index(entry_type) for _, _, entry_type, _ in combos], dtype=np.int64)
+    exit_idx = np.array([PRICE_TYPES.index(exit_type) for _, _, _, exit_type in combos], dtype=np.int64)
+
+    prices, buy_signal, sell_signal, last = m['prices'], m['buy'], m['sell'], m['last']
+    n_dates, n_stocks = last.shape
+    n_strategies = len(names)
+    cost_rate = cost_bps / 1e4
+    slip = slippage_bps / 1e4
+
+    cash = np.full(n_strategies, float(portfolio_size))
+    shares = np.zeros((n_strategies, n_stocks))
+    mark = np.zeros(n_stocks)  # last known close of each stock
+    nav = np.full(n_strategies, float(portfolio_size))
+    daily = {key: np.zeros((n_dates, n_strategies)) for key in ['nav', 'cash', 'invested', 'positions']}
+    positions = np.zeros((n_dates, n_strategies, n_stocks)) if keep_positions else None
+    fills = []
+
+    def fill(t, is_buy, mask, qty, price, notional, cost):
+        s, n = np.nonzero(mask)
+        fills.append((np.full(len(s), t), np.full(len(s), is_buy), s, n, qty[s, n], price[s, n],
+                      notional[s, n], cost[s, n]))
+
+    for t in range(n_dates):
+        # fills in intraday order: the open (sells, then buys), then the close, so a
+        # buy only spends the proceeds of sales that have already happened
+        for session in range(len(PRICE_TYPES)):
+            price_t = prices[session, t]
+
+            # 1. exits on sell signals of the strategies that exit at this price
+            selling = (sell_signal[model_idx, t] & (exit_idx == session)[:, None]
+                       & (shares > 0) & ~np.isnan(price_t))
+            if selling.any():
+                price = np.broadcast_to(price_t * (1 - slip), shares.shape)
+                notional = np.where(selling, shares * price, 0.0)
+                cost = notional * cost_rate
+                fill(t, False, selling, shares, price, notional, cost)
+                cash += (notional - cost).sum(axis=1)
+                shares[selling] = 0.0
+
+            # 2. entries: one lot per buy signal, capped at the stock's share of NAV
+            buying = (buy_signal[model_idx, t] & (entry_idx == session)[:, None]
+                      & ~last[t] & ~np.isnan(price_t))
+            if buying.any():
+                price = np.where(buying, price_t * (1 + slip), 0.0)
+                alloc = (nav / n_stocks)[:, None]
+                lot = np.minimum(trade_fraction * alloc, alloc - shares * price)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    qty = np.where(buying, np.floor(lot / (price * (1 + cost_rate))), 0.0)
+                qty = np.maximum(qty, 0.0)
+                # not enough cash for every buy of the session: scale them all down
+                spend = (qty * price).sum(axis=1) * (1 + cost_rate)
+                short = spend > cash
+                if short.any():
+                    qty[short] = np.floor(qty[short] * (np.maximum(cash[short], 0.0) / spend[short])[:, None])
+                bought = qty > 0
+                if bought.any():
+                    notional = qty * price
+                    cost = notional * cost_rate
+                    fill(t, True, bought, qty, price, notional, cost)
+                    cash -= (notional + cost).sum(axis=1)
+                    shares += qty
+
+        close = prices[1, t]
+        mark = np.where(np.isnan(close), mark, close)
+
+        # 3. a stock's last row: sell what is left at the close
+        closing = last[t] & (shares > 0)
+        if closing.any():
+            price = np.broadcast_to(mark * (1 - slip), shares.shape)
+            notional = np.where(closing, shares * price, 0.0)
+            cost = notional * cost_rate
+            fill(t, False, closing, shares, price, notional, cost)
+            cash += (notional - cost).sum(axis=1)
+            shares[closing] = 0.0
+
+        # 4. mark to market
+        invested = shares @ mark
+        nav = cash + invested
+        daily['nav'][t] = nav
+        daily['cash'][t] = cash
+        daily['invested'][t] = invested
+        daily['positions'][t] = (shares > 0).sum(axis=1)
+        if keep_positions:
+            positions[t] = shares
+
+    return _results(m['dates'], panel['stocks'], names, daily, fills, portfolio_size, positions)
+
+
+def drawdown(nav):
+    """NAV / running peak - 1 along the first axis (0 at a new high, negative below it)."""
+    return nav / np.maximum.accumulate(nav, axis=0) - 1
+
+
+def _results(dates, stocks, names, daily, fills, portfolio_size, positions):
+    n_dates, n_strategies = daily['nav'].shape
+    nav = daily['nav']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        exposure = daily['invested'] / nav
+    dd = drawdown(nav)
+    # ticker / strategy / side columns are categoricals: the fill list runs to
+    # millions of rows on the full universe
+    strategy_codes = np.arange(n_strategies)
+    frame = pd.DataFrame({
+        'date': np.repeat(dates, n_strategies),
+        'strategy': pd.Categorical.from_codes(np.tile(strategy_codes, n_dates), names),
+        'nav': nav.ravel(),
+        'cash': daily['cash'].ravel(),
+        'invested': daily['invested'].ravel(),
+        'exposure': exposure.ravel(),
+        'drawdown': dd.ravel(),
+        'positions': daily['positions'].ravel().astype(np.int64),
+    }, columns=DAILY_COLUMNS)
+
+    if fills:
+        t, is_buy, s, n, qty, price, notional, cost = (np.concatenate(parts) for parts in zip(*fills))
+    else:
+        t = s = n = np.zeros(0, dtype=np.int64)
+        is_buy = np.zeros(0, dtype=bool)
+        qty = price = notional = cost = np.zeros(0)
+    fill_frame = pd.DataFrame({
+        'strategy': pd.Categorical.from_codes(s, names),
+        'stock': pd.Categorical.from_codes(n, pd.Index(stocks).astype(str)),
+        'date': dates[t],
+        'side': pd.Categorical.from_codes(is_buy.astype(np.int8), ['sell', 'buy']),
+        'shares': qty.astype(np.int64),
+        'price': price,
+        'notional': notional,
+        'cost': cost,
+    }, columns=FILL_COLUMNS)
+
+    summary = pd.DataFrame({
+        'strategy': names,
+        'final_nav': nav[-1],
+        'total_return': nav[-1] / portfolio_size - 1,
+        'max_drawdown': dd.min(axis=0),
+        'mean_exposure': exposure.mean(axis=0),
+        'num_buys': np.bincount(s[is_buy], minlength=n_strategies),
+        'num_sells': np.bincount(s[~is_buy], minlength=n_strategies),
+        'total_cost': np.bincount(s, weights=cost, minlength=n_strategies),
+    }, columns=SUMMARY_COLUMNS)
+
+    result = {'daily': frame, 'fills': fill_frame, 'summary': summary}
+    if positions is not None:
+        result.update(positions=positions, strategies=names, stocks=np.asarray(stocks, dtype=object))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate every model x entry/exit strategy as one portfolio.')
+    parser.add_argument('--models', nargs='+', default=['xg3', 'xg7', 'nn3', 'nn7'])
+    parser.add_argument('--portfolio-size', type=float, default=1_000_000.0)
+    parser.add_argument('--trade-fraction', type=float, default=0.20)
+    parser.add_argument('--cost-bps', type=float, default=5.0)
+    parser.add_argument('--slippage-bps', type=float, default=5.0)
+    args = parser.parse_args()
+
+    data_path = 'selected_data_with_nn.arrow'
+    if not os.path.exists(data_path):
+        raise SystemExit(f"Error: '{data_path}' not found. Place it alongside this script.")
+
+    with span('read') as s:
+        df = read_table(data_path)
+        s.rows = len(df)
+    with span('simulate', rows=len(df)):
+        result = simulate(df, args.models, args.portfolio_size, args.trade_fraction,
+                          args.cost_bps, args.slippage_bps)
+
+    out_dir = 'portfolio_details'
+    os.makedirs(out_dir, exist_ok=True)
+    with span('write'):
+        for key in ['daily', 'fills', 'summary']:
+            result[key].to_csv(os.path.join(out_dir, f'simulation_{key}.csv'), index=False)
+    print(f"→ Simulated {len(result['summary'])} strategies over {result['daily']['date'].nunique()} days, "
+          f"{len(result['fills'])} fills written to '{out_dir}'")
+    print(result['summary'].to_string(index=False))
@@ -0,0 +1,157 @@
+# Ticker / date-range queries over a memory-mapped price or indicator table.
+#
+# The store is the Arrow IPC file written by storage.write_arrow: rows sorted by
+# (ticker, date), uncompressed, so memory-mapping it maps the columns in place.
+# Opening a store reads only the ticker column to build the per-ticker offset
+# index, (start, stop) rows of each ticker. The date column is a zero-copy view
+# that is sorted within every ticker's rows.
+#
+# "ticker X between d1 and d2" is then a dict lookup for X's rows plus two binary
+# searches (np.searchsorted) over X's dates. Only that slice of the requested
+# columns is converted to pandas, so the rest of the file is never decoded or even
+# paged in.
+#
+# open_store also takes a Parquet dataset or a .csv (e.g. stocks_with_indicators.parquet).
+# It converts the table once to an .arrow store next to it, and again only when the
+# source is newer than the store.
+#
+# Usage:
+#   python query.py stocks_with_indicators.parquet MSFT --start 2016-01-01 --end 2016-06-30 --columns close rsi
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from storage import TICKER_COLUMNS, is_dataset, read_table, write_arrow
+
+
+def store_path(path):
+    """The .arrow store open_store keeps for a dataset or .csv path."""
+    return os.path.splitext(path.rstrip('/\\'))[0] + '.arrow'
+
+
+def _mtime(path):
+    # newest file of a dataset directory, or the file itself
+    if not is_dataset(path):
+        return os.path.getmtime(path)
+    return max(os.path.getmtime(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def open_store(path):
+    """TickerStore for path, converting a dataset / .csv to an .arrow store when needed."""
+    if path.endswith('.arrow'):
+        return TickerStore(path)
+    store = store_path(path)
+    if not os.path.exists(store) or os.path.getmtime(store) < _mtime(path):
+        write_arrow(read_table(path), store)
+    return TickerStore(store)
+
+
+class TickerStore:
+    """Memory-mapped (ticker, date) table with a per-ticker offset index.
+
+    Args:
+        path (str): .arrow file written by storage.write_arrow.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        self.ticker_col = next((c for c in TICKER_COLUMNS if c in self.table.column_names), None)
+        if self.ticker_col is None:
+            raise ValueError(f"no ticker column (one of {TICKER_COLUMNS}) in '{path}'")
+
+        # rows are sorted by ticker, so every ticker is one run of the column
+        runs = pc.run_end_encode(self.table.column(self.ticker_col).combine_chunks())
+        stops = runs.run_ends.to_numpy().astype(np.int64)
+        starts = np.r_[0, stops[:-1]]
+        tickers = runs.values.to_pylist()
+        if len(set(tickers)) != len(tickers):
+            raise ValueError(f"'{path}' is not sorted by {self.ticker_col}; write it with storage.write_arrow")
+        self.index = {ticker: (int(start), int(stop)) for ticker, start, stop in zip(tickers, starts, stops)}
+
+        dates = self.table.column('date')
+        # one chunk maps straight to a NumPy view; several are concatenated once
+        self.dates = (dates.chunk(0).to_numpy(zero_copy_only=False) if dates.num_chunks == 1
+                      else dates.to_numpy())
+        self.unit = np.datetime_data(self.dates.dtype)[0]
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def tickers(self):
+        return list(self.index)
+
+    @property
+    def columns(self):
+        return [c for c in self.table.column_names if c not in (self.ticker_col, 'date')]
+
+    def _bound(self, value):
+        return np.datetime64(pd.Timestamp(value).to_datetime64(), self.unit)
+
+    def rows(self, stock, start=None, end=None):
+        """(first, stop) row offsets of stock between start and end (inclusive dates).
+
+        Unknown tickers and empty windows give an empty range.
+        """
+        first, stop = self.index.get(str(stock), (0, 0))
+        dates = self.dates[first:stop]
+        lo = first + (np.searchsorted(dates, self._bound(start), side='left') if start is not None else 0)
+        hi = first + (np.searchsorted(dates, self._bound(end), side='right') if end is not None else len(dates))
+        return int(lo), int(max(lo, hi))
+
+    def _columns(self, columns):
+        if columns is None:
+            return self.table.column_names
+        return [self.ticker_col, 'date'] + [c for c in columns if c not in (self.ticker_col, 'date')]
+
+    def query(self, stock, start=None, end=None, columns=None):
+        """Rows of stock between start and end (inclusive), with the ticker, date and columns.
+
+        Returns:
+            pd.DataFrame sorted by date with a fresh 0..n-1 index.
+        """
+        lo, hi = self.rows(stock, start, end)
+        return self.slice(lo, hi, columns)
+
+    def slice(self, lo, hi, columns=None):
+        """Rows lo:hi of the store as a DataFrame (the ticker column as a categorical)."""
+        df = self.table.slice(lo, hi - lo).select(self._columns(columns)).to_pandas()
+        df[self.ticker_col] = df[self.ticker_col].astype('category')
+        return df
+
+    def frame(self, columns=None):
+        """The whole store; its rows line up with the offsets from rows()."""
+        return self.slice(0, len(self), columns)
+
+    def values(self, stock, column, start=None, end=None):
+        """One column of stock between start and end as a NumPy array."""
+        lo, hi = self.rows(stock, start, end)
+        return self.table.column(column).slice(lo, hi - lo).to_numpy()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query one ticker and date window of a price / indicator table.')
+    parser.add_argument('path', help='.arrow store, Parquet dataset or .csv')
+    parser.add_argument('stock')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--columns', nargs='+')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        raise SystemExit(f"Error: '{args.path}' not found. Place it alongside this script.")
+
+    store = open_store(args.path)
+    start = time.perf_counter()
+    df = store.query(args.stock, args.start, args.end, args.columns)
+    elapsed = time.perf_counter() - start
+    print(df.to_string(index=False))
+    print(f"→ {len(df)} of {len(store)} rows in {elapsed * 1000:.2f} ms ({store.path})")
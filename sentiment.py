@@ -0,0 +1,203 @@
+# Headline sentiment scoring with FinBERT (the model used in get_finBert_sentiment.ipynb).
+#
+# Headlines are normalised (unicode NFKC, collapsed whitespace, lower case) and keyed
+# by a hash of that text. Labels are kept in a small SQLite cache next to the data,
+# so a rerun or a new day of news only sends headlines the model has never seen.
+# Repeated titles (the same headline filed under several tickers) are scored once.
+#
+# Unseen headlines are sorted by length and cut into batches with a padded-token
+# budget (batch size x longest headline in the batch), so short headlines run in
+# big batches and long ones in small batches instead of everything padded to the
+# longest title of a fixed batch of 32.
+#
+# Usage (replaces the notebook cells):
+#   python sentiment.py                    # writes finBert_sentiment.csv
+#   python sentiment.py --threads 8
+#   python sentiment.py --stub             # keyword stub instead of the model
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import unicodedata
+
+import pandas as pd
+
+from instrument import span
+
+MODEL_NAME = 'yiyanghkust/finbert-tone'
+CACHE_PATH = 'finbert_cache.sqlite'
+
+MAX_BATCH = 64
+BATCH_TOKENS = 2048
+MAX_LENGTH = 128
+
+
+def normalize_headline(text):
+    # finbert-tone has an uncased vocabulary, so lower-casing does not change its input
+    text = unicodedata.normalize('NFKC', str(text))
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def headline_key(text):
+    return hashlib.sha1(normalize_headline(text).encode('utf-8')).hexdigest()
+
+
+def length_batches(texts, max_batch=MAX_BATCH, batch_tokens=BATCH_TOKENS):
+    """Split texts into batches of similar length (word count as the length proxy).
+
+    Returns lists of indices into texts; a batch grows until adding the next text would
+    push len(batch) * longest text past batch_tokens, or it holds max_batch texts.
+    """
+    lengths = [len(t.split()) + 2 for t in texts]  # +2 for [CLS] / [SEP]
+    order = sorted(range(len(texts)), key=lengths.__getitem__)
+    batches, batch = [], []
+    for i in order:
+        # sorted ascending, so the newest text is the longest of the batch
+        if batch and (len(batch) == max_batch or (len(batch) + 1) * lengths[i] > batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class FinBertModel:
+    """FinBERT on CPU; __call__ maps a list of headlines to lower case labels."""
+
+    def __init__(self, model_name=MODEL_NAME, num_threads=None):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        self.id2label = {i: label.lower() for i, label in self.model.config.id2label.items()}
+        self.name = model_name
+
+    def __call__(self, texts):
+        inputs = self.tokenizer(list(texts), padding=True, truncation=True,
+                                max_length=MAX_LENGTH, return_tensors='pt')
+        with self.torch.inference_mode():
+            logits = self.model(**inputs).logits
+        return [self.id2label[i] for i in logits.argmax(dim=-1).tolist()]
+
+
+class StubModel:
+    """Keyword model with the same interface as FinBertModel, for tests and dry runs."""
+
+    POSITIVE = ('beat', 'beats', 'upgrade', 'upgraded', 'raises', 'gain', 'gains', 'record', 'surge', 'rally')
+    NEGATIVE = ('miss', 'misses', 'downgrade', 'downgraded', 'cuts', 'loss', 'falls', 'drop', 'plunge', 'lawsuit')
+
+    name = 'keyword-stub'
+
+    def __init__(self):
+        self.calls = 0
+        self.seen = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        self.seen += len(texts)
+        labels = []
+        for text in texts:
+            words = set(normalize_headline(text).split())
+            score = len(words.intersection(self.POSITIVE)) - len(words.intersection(self.NEGATIVE))
+            labels.append('positive' if score > 0 else 'negative' if score < 0 else 'neutral')
+        return labels
+
+
+class SentimentCache:
+    """(model name, headline key) -> label, stored in SQLite."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS sentiment '
+                          '(model TEXT, key TEXT, label TEXT NOT NULL, PRIMARY KEY (model, key))')
+
+    def get_many(self, model_name, keys):
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), 900):  # stay under SQLite's bound-parameter limit
+            chunk = keys[i:i + 900]
+            marks = ','.join('?' * len(chunk))
+            found.update(self.conn.execute(
+                f'SELECT key, label FROM sentiment WHERE model = ? AND key IN ({marks})', [model_name] + chunk))
+        return found
+
+    def put_many(self, model_name, items):
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO sentiment VALUES (?, ?, ?)',
+                                  [(model_name, key, label) for key, label in items])
+
+    def close(self):
+        self.conn.close()
+
+
+def score_headlines(titles, model, cache, max_batch=MAX_BATCH, batch_tokens=BATCH_TOKENS):
+    """Label every title, sending only headlines missing from the cache to the model.
+
+    Args:
+        titles (iterable): headlines, duplicates allowed.
+        model (callable): list of headlines -> list of labels, with a .name used to
+            keep its cache entries apart (FinBertModel, StubModel).
+        cache (SentimentCache): read for known headlines, updated after every batch.
+
+    Returns:
+        (list, int): one label per title, and the number of headlines sent to the model.
+    """
+    titles = [str(t) for t in titles]
+    keys = [headline_key(t) for t in titles]
+
+    # one representative title per distinct normalised headline
+    unique = dict(zip(keys, titles))
+    labels = cache.get_many(model.name, unique)
+    missing = [k for k in unique if k not in labels]
+
+    texts = [normalize_headline(unique[k]) for k in missing]
+    for batch in length_batches(texts, max_batch, batch_tokens):
+        batch_labels = model([texts[i] for i in batch])
+        scored = [(missing[i], label) for i, label in zip(batch, batch_labels)]
+        cache.put_many(model.name, scored)  # persist as we go so an interrupted run keeps its work
+        labels.update(scored)
+
+    return [labels[k] for k in keys], len(missing)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score news headlines with FinBERT.')
+    parser.add_argument('--threads', type=int, default=None, help='torch CPU threads (default: torch default)')
+    parser.add_argument('--stub', action='store_true', help='use the keyword stub instead of FinBERT')
+    parser.add_argument('--cache', default=CACHE_PATH)
+    parser.add_argument('--batch-tokens', type=int, default=BATCH_TOKENS)
+    args = parser.parse_args()
+
+    news_file = 'analyst_ratings_processed.csv'
+    price_file = 'all_stocks_5yr.csv'
+    for p in (news_file, price_file):
+        if not os.path.isfile(p):
+            raise SystemExit(f"Error: '{p}' not found. Place it alongside this script.")
+
+    with span('read_csv') as s:
+        df = pd.read_csv(news_file)
+        snp500_tickers = pd.read_csv(price_file, usecols=['Name'])['Name'].unique().tolist()
+        filtered_df = df[df['stock'].isin(snp500_tickers)].copy()
+        s.rows = len(df)
+    print(f"Filtered rows: {len(filtered_df)}")
+
+    model = StubModel() if args.stub else FinBertModel(num_threads=args.threads)
+    cache = SentimentCache(args.cache)
+    try:
+        with span('score_headlines', rows=len(filtered_df)):
+            filtered_df['sentiment'], n_scored = score_headlines(
+                filtered_df['title'], model, cache, batch_tokens=args.batch_tokens)
+    finally:
+        cache.close()
+    print(f"Scored {n_scored} new headlines, {len(filtered_df) - n_scored} rows from cache / duplicates")
+
+    with span('write', rows=len(filtered_df)):
+        filtered_df.to_csv('finBert_sentiment.csv', index=False)
+    print(filtered_df['sentiment'].value_counts())
@@ -12,122 +12,94 @@
 # MACD: The moving average convergence divergence, calculated from a 12-day EMA and a 26-day EMA of Close % Change. 
 # This feature is another popular technical indicator that measures the trend and momentum of an asset.
 
-import numpy as np
-import pandas as pd
-
-INPUT_CSV   = 'all_stocks_5yr.csv'
-OUTPUT_CSV  = 'stocks_with_indicators.csv' # output csv
-
-# === LOAD & PREP ===
-df = pd.read_csv(INPUT_CSV, parse_dates=['date'])
-
-grouped = df.groupby('Name', group_keys=False)
-
-# DAILY VARIATION
-# (High – Low) ÷ Open
-df['daily_variation'] = (df['high'] - df['low']) / df['open']
-
-# DAILY RETURN
-# % change in Close from prior day
-df['daily_return'] = grouped['close'].transform(lambda x: x.pct_change())
-
-# 5-DAY SMA & STD (approximately 1 trading week)
-df['sma_7'] = grouped['close'].transform(lambda x: x.rolling(window=5).mean())
-df['std_7'] = grouped['close'].transform(lambda x: x.rolling(window=5).std())
-
-# 10-DAY EMA (approximately 2 trading weeks)
-df['ema_14'] = grouped['close'].transform(lambda x: x.ewm(span=10, adjust=False).mean())
-
-# MACD ON %-CHANGE
-ema12_ret = grouped['daily_return'].transform(lambda x: x.ewm(span=12, adjust=False).mean())
-ema26_ret = grouped['daily_return'].transform(lambda x: x.ewm(span=26, adjust=False).mean())
-df['macd']    = ema12_ret - ema26_ret
-
-# MACD SIGNAL LINE
-df['macd_signal'] = df['macd'].ewm(span=9, adjust=False).mean()
-
-"""===================Amelie's Section========================================"""
-# CUMULATIVE RETURN
-first_close = df['close'].iloc[0]
-df['cumulative_return'] = df.groupby('Name').apply(lambda g: ((g['close'] - g['close'].iloc[0]) / g['close'].iloc[0]) * 100).reset_index(level=0, drop=True)
-
-# Gain and Loss - Note: This might take up a lot of space so I'm not sure if you want to keep these columns or not
-df['gain'] = df['daily_return'].apply(lambda x: x if x > 0 else 0)
-df['loss'] = df['daily_return'].apply(lambda x: -x if x < 0 else 0)
-
-# RSI
-avg_gain = df.groupby('Name')['gain'].rolling(window=14, min_periods=1).mean().reset_index(level=0, drop=True)
-avg_loss = df.groupby('Name')['loss'].rolling(window=14, min_periods=1).mean().reset_index(level=0, drop=True)
-rs = avg_gain / avg_loss
-df['rsi'] = 100 - (100 / (1 + rs))
+# RSI, Stochastic Oscillator, ATR and ADX (plus the intermediate columns they are built
+# from) and the 3 / 7 day buy, hold, sell labels are added as well.
+#
+# All of the maths lives in indicators.py, which sorts the panel once by (Name, date)
+# and computes every column in a single vectorized pass (see benchmarks/bench_indicators.py).
+#
+# Usage:
+#   python stock_feature_engineering.py                        # full recompute from INPUT_CSV
+#   python stock_feature_engineering.py --append new_bars.csv  # only the new trading days
+#   PIPELINE_REPORT=run_report.jsonl python stock_feature_engineering.py  # per-stage report (instrument.py)
+#
+# Output is a Parquet dataset partitioned by ticker and year (see storage.py).
+# The full run also saves the per-ticker carry state (last EMA/ATR/ADX values and the
+# last few bars) to STATE_FILE, so --append only computes the new rows and rewrites
+# the (ticker, year) partitions they land in, without re-reading the history.
+#
+# --compact stores the smaller schema from indicators.compact_frame: the intermediate
+# columns (gain/loss, L14/H14, prev_*, true_range, +/- dir and dm) are left out and
+# can be recomputed with indicators.restore_intermediates, floats are float32 and
+# tickers / labels are categorical. The choice is kept in STATE_FILE so --append
+# writes rows with the same schema.
+
+import argparse
+import os
+import pickle
 
-# Stochastic Oscillator
-df['L14'] = df.groupby('Name')['low'].rolling(window=14, min_periods=1).min().reset_index(level=0, drop=True)
-df['H14'] = df.groupby('Name')['high'].rolling(window=14, min_periods=1).max().reset_index(level=0, drop=True)
-df['stochastic_oscillator'] = ((df['close'] - df['L14']) / (df['H14'] - df['L14'])) * 100
-
-# ATR (Average True Range, used to calculate volatility) over 14 days
-# True Range (could be useful for other calcs)
-# Shift the data to get previous day's values
-df['prev_high'] = df.groupby('Name')['high'].shift(1)
-df['prev_low'] = df.groupby('Name')['low'].shift(1)
-df['prev_close'] = df.groupby('Name')['close'].shift(1)
-
-tr1 = df['high'] - df['low']
-tr2 = np.abs(df['high'] - df['prev_close'])
-tr3 = np.abs(df['low'] - df['prev_close'])
-
-df['true_range'] = np.maximum.reduce([tr1, tr2, tr3])
-
-# ATR (Average True Range)
-df['atr'] = df.groupby('Name')['true_range'].transform(lambda x: x.ewm(alpha=1/14, adjust=False).mean())
-
-# ADX (Average Directional Index), used to calculate strength and direction of the index over 14 days
-# Directional Movement (DM) calculations
-df['plus_dir'] = df['high'] - df['prev_high']
-df['minus_dir'] = df['prev_low'] - df['low']
-
-# Only keep positive directional movement
-df['plus_dm'] = np.where((df['plus_dir'] > df['minus_dir']) & (df['plus_dir'] > 0), df['plus_dir'], 0)
-df['minus_dm'] = np.where((df['minus_dir'] > df['plus_dir']) & (df['minus_dir'] > 0), df['minus_dir'], 0)
-
-# Smooth +DM and -DM over 14 periods per stock
-df['smoothed_plus_dm'] = df.groupby('Name')['plus_dm'].transform(lambda x: x.ewm(span=14, adjust=False).mean())
-df['smoothed_minus_dm'] = df.groupby('Name')['minus_dm'].transform(lambda x: x.ewm(span=14, adjust=False).mean())
-
-df['smoothed_plus_dm'] = (df['smoothed_plus_dm'] / df['atr']) * 100
-df['smoothed_minus_dm'] = (df['smoothed_minus_dm'] / df['atr']) * 100
-
-# Calculate DX
-df['dx'] = (np.abs(df['smoothed_plus_dm'] - df['smoothed_minus_dm']) / np.abs((df['smoothed_plus_dm'] + df['smoothed_minus_dm']))) * 100
-
-# Calculate ADX (14-period smoothing of DX)
-df['adx'] = df.groupby('Name')['dx'].transform(lambda x: x.ewm(span=14, adjust=False).mean())
-
-# Actual price 3 and 7 days out
-df['future_price_3'] = df.groupby('Name')['close'].shift(periods=-3)
-df['future_price_7'] = df.groupby('Name')['close'].shift(periods=-5)
+import pandas as pd
 
-# 3 and 7 day BUY, HOLD, SELL tags
-# Calculate future returns using trading days (approximately 5 trading days per week)
-df['future_return_3'] = df.groupby('Name')['close'].transform(lambda x: x.shift(-3) / x - 1)  # 3 trading days
-df['future_return_7'] = df.groupby('Name')['close'].transform(lambda x: x.shift(-5) / x - 1)  # 5 trading days (approximately 1 week)
+from indicators import compact_frame, compute_indicators, update_indicators
+from instrument import span
+from storage import dataset_size, encoded_size, upsert_table, write_table
 
-# Use FUTURE return
-def create_label(return_value):
-    if return_value > 0.03:  # 3% threshold
-        return 'buy'
-    elif return_value < -0.03:  # -3% threshold
-        return 'sell'
-    else:
-        return 'hold'
-
-df['label_3'] = df['future_return_3'].apply(create_label)
-df['label_7'] = df['future_return_7'].apply(create_label)
-
-# Drop future return columns
-df = df.drop(['future_return_3', 'future_return_7'], axis=1)
-
-# Output to new CSV
-df.to_csv(OUTPUT_CSV, index=False)
-print(f"Wrote indicators to {OUTPUT_CSV}")
+INPUT_CSV   = 'all_stocks_5yr.csv'
+OUTPUT_DATASET = 'stocks_with_indicators.parquet' # output dataset (directory)
+STATE_FILE  = 'indicator_state.pkl'              # carry state for --append
+
+parser = argparse.ArgumentParser(description='Compute technical indicators and buy/hold/sell labels.')
+parser.add_argument('--append', metavar='NEW_BARS_CSV',
+                    help='only process these new bars, continuing from STATE_FILE')
+parser.add_argument('--compact', action='store_true',
+                    help='drop intermediate columns, use float32 and categoricals (full run only)')
+args = parser.parse_args()
+
+if args.append is None:
+    # === LOAD & PREP ===
+    with span('read_csv') as s:
+        df = pd.read_csv(INPUT_CSV, parse_dates=['date'])
+        s.rows = len(df)
+
+    # === INDICATORS & LABELS ===
+    with span('indicators', rows=len(df)):
+        df, state = compute_indicators(df, return_state=True)
+    state['compact'] = args.compact
+
+    if args.compact:
+        full = df
+        with span('compact', rows=len(full)):
+            df = compact_frame(full)
+        mem_full, mem_compact = full.memory_usage(deep=True).sum(), df.memory_usage(deep=True).sum()
+        disk_full, disk_compact = encoded_size(full), encoded_size(df)
+        print(f"Memory : {mem_full / 1e6:8.1f} MB -> {mem_compact / 1e6:8.1f} MB ({1 - mem_compact / mem_full:.0%} smaller)")
+        print(f"Parquet: {disk_full / 1e6:8.1f} MB -> {disk_compact / 1e6:8.1f} MB ({1 - disk_compact / disk_full:.0%} smaller)")
+        del full
+
+    # Output to new dataset
+    with span('write', rows=len(df)):
+        write_table(df, OUTPUT_DATASET)
+    print(f"Wrote indicators to {OUTPUT_DATASET} ({dataset_size(OUTPUT_DATASET) / 1e6:.1f} MB on disk)")
+
+else:
+    if not os.path.isfile(STATE_FILE):
+        raise SystemExit(f"Error: '{STATE_FILE}' not found. Run a full recompute first.")
+    with open(STATE_FILE, 'rb') as f:
+        state = pickle.load(f)
+
+    with span('read_csv') as s:
+        new_bars = pd.read_csv(args.append, parse_dates=['date'])
+        s.rows = len(new_bars)
+    compact = state.get('compact', False)
+    with span('update_indicators', rows=len(new_bars)):
+        rows, state = update_indicators(state, new_bars)
+    state['compact'] = compact
+
+    # new rows plus the earlier rows whose future_price / label just became known
+    if not rows.empty:
+        with span('upsert', rows=len(rows)):
+            upsert_table(compact_frame(rows) if compact else rows, OUTPUT_DATASET)
+    print(f"Appended {len(rows)} new/updated rows to {OUTPUT_DATASET}")
+
+with open(STATE_FILE, 'wb') as f:
+    pickle.dump(state, f)
@@ -0,0 +1,195 @@
+# Columnar storage shared by the pipeline scripts.
+#
+# Tables are written as Parquet datasets partitioned by ticker and year:
+#
+#   stocks_with_indicators.parquet/Name=AAPL/year=2016/part-0.parquet
+#
+# Prices / indicators keep their numeric types, dates are stored as timestamps and
+# the low-cardinality string columns (tickers, label_3/label_7, model predictions)
+# are dictionary encoded and come back as pandas categoricals. read_table pushes the
+# column selection and the (stock, date) filters down to Arrow, so reading one ticker
+# or one date window only opens the matching partition files.
+#
+# read_table also accepts a plain .csv path (e.g. the notebook outputs) and applies
+# the same column / stock / date selection after loading it.
+#
+# Small tables that are read whole (the merged portfolio input) can be written as a
+# single uncompressed Arrow IPC file with write_arrow; read_table memory-maps those,
+# so the columns are not copied through a decoder on load.
+
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+TICKER_COLUMNS = ('stock', 'Name')
+# string columns with at most this many distinct values are stored as categories
+MAX_CATEGORIES = 32
+
+
+def _ticker_column(columns):
+    for col in TICKER_COLUMNS:
+        if col in columns:
+            return col
+    raise ValueError(f"no ticker column (one of {TICKER_COLUMNS}) in {list(columns)}")
+
+
+def _dataset_ticker_column(path):
+    # partition directories look like <ticker column>=<value>
+    for entry in os.listdir(path):
+        if '=' in entry:
+            return entry.split('=', 1)[0]
+    raise ValueError(f"'{path}' is not a partitioned dataset")
+
+
+def _partitioning(ticker_col):
+    return ds.partitioning(pa.schema([(ticker_col, pa.string()), ('year', pa.int32())]), flavor='hive')
+
+
+def _to_arrow(df, ticker_col):
+    df = df.copy()
+    df['year'] = df['date'].dt.year.astype('int32')
+    for col in df.columns:
+        if col != ticker_col and (df[col].dtype == object or pd.api.types.is_string_dtype(df[col])):
+            if df[col].nunique() <= MAX_CATEGORIES:
+                df[col] = df[col].astype('category')
+    df[ticker_col] = df[ticker_col].astype(str)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def is_dataset(path):
+    return os.path.isdir(path)
+
+
+def write_table(df, path, existing='overwrite'):
+    """Write a (ticker, date) table as a dataset partitioned by ticker and year.
+
+    Args:
+        df (pd.DataFrame): must have a 'date' column and a 'stock' or 'Name' column.
+        path (str): dataset directory, e.g. 'stocks_with_indicators.parquet'.
+        existing (str): 'overwrite' replaces the whole dataset, 'partitions' only
+            replaces the partitions that df has rows for.
+    """
+    ticker_col = _ticker_column(df.columns)
+    if existing == 'overwrite' and os.path.isdir(path):
+        shutil.rmtree(path)
+    df = df.sort_values([ticker_col, 'date'], kind='stable')
+    ds.write_dataset(
+        _to_arrow(df, ticker_col), path, format='parquet',
+        partitioning=_partitioning(ticker_col),
+        basename_template='part-{i}.parquet',
+        existing_data_behavior='delete_matching',
+    )
+
+
+def upsert_table(df, path):
+    """Insert or replace rows by (ticker, date), rewriting only the partitions they fall in."""
+    ticker_col = _ticker_column(df.columns)
+    if os.path.isdir(path):
+        years = df['date'].dt.year
+        old = read_table(path, stocks=df[ticker_col].unique(),
+                         start=f'{years.min()}-01-01', end=f'{years.max()}-12-31')
+        # keep the untouched rows of every (ticker, year) partition that will be rewritten
+        touched = pd.MultiIndex.from_arrays([df[ticker_col].astype(str), years])
+        in_touched = pd.MultiIndex.from_arrays([old[ticker_col].astype(str), old['date'].dt.year]).isin(touched)
+        new_keys = pd.MultiIndex.from_arrays([df[ticker_col].astype(str), df['date']])
+        replaced = pd.MultiIndex.from_arrays([old[ticker_col].astype(str), old['date']]).isin(new_keys)
+        old = old[in_touched & ~replaced].astype({ticker_col: str})
+        df = pd.concat([old, df.astype({ticker_col: str})], ignore_index=True)
+    write_table(df, path, existing='partitions')
+
+
+def write_arrow(df, path):
+    """Write df as one uncompressed Arrow IPC file (memory-mappable, see read_table)."""
+    ticker_col = _ticker_column(df.columns)
+    df = df.sort_values([ticker_col, 'date'], kind='stable')
+    table = _to_arrow(df, ticker_col).drop_columns(['year'])
+    with pa.OSFile(path, 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _select(df, ticker_col, columns, stocks, start, end):
+    # column / stock / date selection for tables that are loaded whole
+    usecols = None if columns is None else [ticker_col, 'date'] + [c for c in columns if c not in (ticker_col, 'date')]
+    if stocks is not None:
+        df = df[df[ticker_col].isin(list(stocks))]
+    if start is not None:
+        df = df[df['date'] >= start]
+    if end is not None:
+        df = df[df['date'] <= end]
+    if usecols is not None:
+        df = df[usecols]
+    return df.sort_values([ticker_col, 'date'], kind='stable').reset_index(drop=True)
+
+
+def dataset_size(path):
+    """Bytes on disk of a dataset directory (or a single file)."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def encoded_size(df):
+    """Bytes df takes as Parquet with the encoding write_table uses (in memory, unpartitioned)."""
+    sink = pa.BufferOutputStream()
+    pq.write_table(_to_arrow(df, _ticker_column(df.columns)), sink)
+    return sink.getvalue().size
+
+
+def read_table(path, columns=None, stocks=None, start=None, end=None):
+    """Load a table, optionally only some columns, tickers and a date window.
+
+    Args:
+        path (str): dataset directory written by write_table, an .arrow file written
+            by write_arrow, or a .csv file.
+        columns (list): columns to return (ticker and date are always included).
+        stocks (list): tickers to keep.
+        start, end: inclusive date bounds (anything pd.Timestamp accepts).
+
+    Returns:
+        pd.DataFrame sorted by (ticker, date).
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    if path.endswith('.arrow'):
+        table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        ticker_col = _ticker_column(table.column_names)
+        if columns is not None:
+            table = table.select([ticker_col, 'date'] + [c for c in columns if c not in (ticker_col, 'date')])
+        df = table.to_pandas()
+        df[ticker_col] = df[ticker_col].astype('category')
+        return _select(df, ticker_col, None, stocks, start, end)
+
+    if not is_dataset(path):
+        ticker_col = _ticker_column(pd.read_csv(path, nrows=0).columns)
+        usecols = None if columns is None else [ticker_col, 'date'] + [c for c in columns if c not in (ticker_col, 'date')]
+        df = pd.read_csv(path, usecols=usecols, parse_dates=['date'])
+        return _select(df, ticker_col, columns, stocks, start, end)
+
+    ticker_col = _dataset_ticker_column(path)
+    dataset = ds.dataset(path, format='parquet', partitioning=_partitioning(ticker_col))
+
+    # partition pruning on ticker / year, row-group statistics on date
+    conditions = []
+    if stocks is not None:
+        conditions.append(ds.field(ticker_col).isin([str(s) for s in stocks]))
+    if start is not None:
+        conditions += [ds.field('year') >= start.year, ds.field('date') >= start]
+    if end is not None:
+        conditions += [ds.field('year') <= end.year, ds.field('date') <= end]
+    expr = None
+    for cond in conditions:
+        expr = cond if expr is None else expr & cond
+
+    if columns is None:
+        columns = [c for c in dataset.schema.names if c != 'year']
+    else:
+        columns = [ticker_col, 'date'] + [c for c in columns if c not in (ticker_col, 'date')]
+    df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+    df[ticker_col] = df[ticker_col].astype('category')
+    return df.sort_values([ticker_col, 'date'], kind='stable').reset_index(drop=True)
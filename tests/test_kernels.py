@@ -0,0 +1,131 @@
+# kernels.py against pandas' groupby().rolling() / groupby().ewm(adjust=False), and
+# segmented_ewm against indicators.grouped_ewm when resuming from a saved state.
+#
+# Run from the repo root:
+#   python -m pytest tests
+
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root
+import kernels
+from indicators import SCAN_MAX_GROUPS, ewm_alpha, group_offsets, grouped_ewm
+
+WINDOWS = [1, 2, 5, 14, 60]
+TOLERANCE = 1e-9
+# pandas' rolling std keeps a rounding residue (up to ~1e-6) after values leave the
+# window; the kernel recomputes each window
+STD_TOLERANCE = 1e-5
+EWM_SPANS = [10, 12, 26]
+
+
+def ragged_panel(n_stocks=60, max_days=300, seed=175):
+    # tickers of 1 to max_days rows with NaN gaps and runs of equal prices
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, max_days + 1, n_stocks)
+    lengths[:2] = [1, max_days]
+    pos = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    values = (50 * np.exp(np.cumsum(rng.normal(0, 0.015, len(pos))))).round(2)
+    values[rng.random(len(pos)) < 0.1] = np.nan
+    values[(pos % 97) < 12] = 25.0
+    return np.repeat(np.arange(n_stocks), lengths), pos, values
+
+
+@pytest.fixture(scope='module')
+def panel():
+    return ragged_panel()
+
+
+def _pandas_rolling(values, group, window, min_periods, func):
+    rolled = pd.Series(values).groupby(group).rolling(window, min_periods=min_periods)
+    return getattr(rolled, func)().reset_index(level=0, drop=True).sort_index().to_numpy()
+
+
+def _assert_close(expected, actual, tolerance):
+    np.testing.assert_array_equal(np.isnan(expected), np.isnan(actual))
+    ok = ~np.isnan(expected)
+    assert np.max(np.abs(expected[ok] - actual[ok]), initial=0.0) <= tolerance
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+@pytest.mark.parametrize('func', ['min', 'max', 'mean', 'std'])
+def test_rolling_matches_pandas(panel, func, window):
+    group, pos, values = panel
+    for min_periods in sorted({1, window}):
+        expected = _pandas_rolling(values, group, window, min_periods, func)
+        actual = getattr(kernels, f'rolling_{func}')(values, pos, window, min_periods)
+        _assert_close(expected, actual, STD_TOLERANCE if func == 'std' else TOLERANCE)
+
+
+@pytest.mark.parametrize('window', [2, 5, 14])
+def test_rolling_std_flat_window_is_zero(panel, window):
+    group, pos, values = panel
+    actual = kernels.rolling_std(values, pos, window, 1)
+    # windows whose non-NaN values are all 25.0 (the flat stretches)
+    flat = (kernels.rolling_min(values, pos, window, 2) == 25.0) & (kernels.rolling_max(values, pos, window, 2) == 25.0)
+    assert flat.any()
+    assert (actual[flat] == 0).all()
+
+
+def test_rolling_empty():
+    empty = np.zeros(0)
+    for func in ['min', 'max', 'mean', 'std']:
+        assert len(getattr(kernels, f'rolling_{func}')(empty, np.zeros(0, dtype=np.int64), 5, 1)) == 0
+
+
+def test_window_sums_stay_exact_on_long_series():
+    # a random walk as long as SPX.csv, at a level where cumsum differences lose digits
+    rng = np.random.default_rng(175)
+    level = (17.66 * np.exp(np.cumsum(rng.normal(0.0002, 0.012, 23_323)))).round(2) + 1e9
+    pos = np.arange(len(level))
+    window = 250
+    total, count = kernels.window_sum_count(level, pos, window)
+    first = pos - np.minimum(pos, window - 1)
+    rows = rng.choice(len(level), 500, replace=False)
+    exact = np.array([math.fsum(level[first[i]:i + 1]) for i in rows])
+    np.testing.assert_array_equal(count, pos - first + 1)
+    # within a few ulps of the window total (2.5e11), never drifting along the series
+    assert np.max(np.abs(total[rows] - exact)) <= 1e-4
+
+
+def test_segmented_ewm_matches_pandas(panel):
+    group, _, values = panel
+    starts, lengths = group_offsets(group)
+    columns = np.column_stack([values * (1 + i) for i in range(len(EWM_SPANS))])
+    expected = np.column_stack([
+        pd.Series(columns[:, i]).groupby(group).transform(lambda x, s=s: x.ewm(span=s, adjust=False).mean())
+        for i, s in enumerate(EWM_SPANS)])
+    actual, _ = kernels.segmented_ewm(columns, [ewm_alpha(span=s) for s in EWM_SPANS], starts, lengths)
+    np.testing.assert_array_equal(np.isnan(expected), np.isnan(actual))
+    ok = ~np.isnan(expected)
+    assert np.max(np.abs(expected[ok] - actual[ok]) / np.abs(expected[ok])) <= TOLERANCE
+
+
+def test_segmented_ewm_resumes_like_grouped_ewm(panel):
+    group, pos, values = panel
+    starts, lengths = group_offsets(group)
+    assert len(starts) > SCAN_MAX_GROUPS  # grouped_ewm takes its per-day loop
+    columns = np.column_stack([values * (1 + i) for i in range(len(EWM_SPANS))])
+    alphas = [ewm_alpha(span=s) for s in EWM_SPANS]
+
+    # first 40 rows of every ticker, then the rest resumed from the saved state;
+    # tickers of up to 40 rows resume with no rows at all
+    head = np.minimum(lengths, 40)
+    _, state = grouped_ewm(columns, alphas, starts, head)
+    out_loop, state_loop = grouped_ewm(columns, alphas, starts + head, lengths - head, state)
+    out_scan, state_scan = kernels.segmented_ewm(columns, alphas, starts + head, lengths - head, state)
+
+    np.testing.assert_array_equal(np.isnan(out_loop), np.isnan(out_scan))
+    np.testing.assert_allclose(out_scan, out_loop, rtol=1e-12, equal_nan=True)
+    for loop, scan in zip(state_loop, state_scan):
+        np.testing.assert_allclose(scan, loop, rtol=1e-12, equal_nan=True)
+
+    # and the resumed rows equal one pass over the whole history
+    full, _ = grouped_ewm(columns, alphas, starts, lengths)
+    resumed = pos >= np.repeat(head, lengths)
+    np.testing.assert_allclose(out_scan[resumed], full[resumed], rtol=1e-12, equal_nan=True)
@@ -0,0 +1,229 @@
+# Walk-forward training / evaluation for the label_3 and label_7 classifiers
+# (XGBoost, logistic regression and the MLP from the notebooks).
+#
+# The feature matrix is built once per feature config -- same preprocessing as the
+# notebooks: drop title / date / the other label, LabelEncoder'd stock_id, inf -> NaN,
+# dropna -- and cached as .npy files under FEATURE_CACHE/<key>/. The key hashes the
+# config together with the source file's size and mtime, so editing either rebuilds
+# it. Workers open the arrays with mmap_mode='r' instead of re-reading the CSV.
+#
+# Folds are walk-forward per ticker: every ticker's rows are in date order, the first
+# min_train of them are the initial training window and the rest is cut into n_folds
+# consecutive test blocks. Fold k trains on everything before its test block (or the
+# last `window` rows when a rolling window is given) and tests on the block, for all
+# tickers at once. Every (model, fold) pair is one task in a process pool.
+#
+# Usage:
+#   python walk_forward.py --target label_3 --models xgboost logreg mlp --folds 4
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.preprocessing import LabelEncoder
+
+FEATURE_CACHE = 'feature_cache'
+SEED = 42
+LABELS = ['label_3', 'label_7']
+MODELS = ['xgboost', 'logreg', 'mlp']
+
+
+def feature_config(source='training_data.csv', target='label_3', stock_id=True):
+    """Everything that decides the feature matrix; its hash is the cache key."""
+    other = [label for label in LABELS if label != target]
+    return {'source': source, 'target': target, 'drop': ['title'] + other, 'stock_id': stock_id}
+
+
+def _cache_dir(config):
+    stat = os.stat(config['source'])
+    key = json.dumps({**config, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}, sort_keys=True)
+    return os.path.join(FEATURE_CACHE, hashlib.sha1(key.encode()).hexdigest()[:16])
+
+
+def build_features(config):
+    """Build (or find) the cached feature arrays for config and return their directory."""
+    path = _cache_dir(config)
+    if os.path.isfile(os.path.join(path, 'meta.json')):
+        return path
+
+    df = pd.read_csv(config['source'])
+    df = df.drop(columns=[c for c in config['drop'] if c in df.columns])
+    stock = df['stock'].astype(str)
+    if config['stock_id']:
+        df['stock_id'] = LabelEncoder().fit_transform(stock)
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.drop(columns=['stock'])
+    df = df.assign(_stock=stock).sort_values(['_stock', 'date'], kind='stable')
+    df.replace([np.inf, -np.inf], np.nan, inplace=True)
+    df.dropna(inplace=True)
+
+    target = config['target']
+    feature_names = [c for c in df.columns if c not in (target, 'date', '_stock')]
+    label_encoder = LabelEncoder().fit(df[target])
+    stock_codes, stocks = pd.factorize(df['_stock'], sort=True)
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'X.npy'), df[feature_names].to_numpy(dtype=np.float64))
+    np.save(os.path.join(path, 'y.npy'), label_encoder.transform(df[target]).astype(np.int8))
+    np.save(os.path.join(path, 'stock.npy'), stock_codes.astype(np.int32))
+    np.save(os.path.join(path, 'date.npy'), df['date'].to_numpy(dtype='datetime64[D]').astype(np.int64))
+    # meta.json last: its presence marks a complete cache entry
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'config': config, 'features': feature_names,
+                   'classes': label_encoder.classes_.tolist(), 'stocks': list(stocks)}, f, indent=1)
+    return path
+
+
+def load_features(path):
+    """Memory-mapped arrays of a cache entry: dict with X, y, stock, date and meta."""
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ('X', 'y', 'stock', 'date')}
+    with open(os.path.join(path, 'meta.json')) as f:
+        arrays['meta'] = json.load(f)
+    return arrays
+
+
+def walk_forward_folds(stock_codes, n_folds=4, min_train=0.5, window=None):
+    """Per-ticker walk-forward folds over rows sorted by (stock, date).
+
+    Args:
+        stock_codes (np.ndarray): ticker code per row, rows grouped by ticker in date order.
+        n_folds (int): test blocks per ticker after the initial training window.
+        min_train (float): share of each ticker's rows in the first training window.
+        window (int): rolling training window in rows per ticker; None trains on all
+            earlier rows (expanding window).
+
+    Returns:
+        list of (train_idx, test_idx) arrays, one pair per fold.
+    """
+    stock_codes = np.asarray(stock_codes)
+    n = len(stock_codes)
+    starts = np.flatnonzero(np.r_[True, stock_codes[1:] != stock_codes[:-1]]) if n else np.zeros(0, dtype=np.int64)
+    lengths = np.diff(np.r_[starts, n])
+    pos = np.arange(n) - np.repeat(starts, lengths)
+
+    initial = np.repeat((lengths * min_train).astype(np.int64), lengths)
+    step = np.repeat((lengths - (lengths * min_train).astype(np.int64)) // n_folds, lengths)
+
+    folds = []
+    for k in range(n_folds):
+        test_start = initial + k * step
+        # the last block also takes the rows left over by the integer division
+        test_end = np.where(k == n_folds - 1, np.repeat(lengths, lengths), test_start + step)
+        train_start = 0 if window is None else np.maximum(test_start - window, 0)
+        train = (pos >= train_start) & (pos < test_start) & (step > 0)
+        test = (pos >= test_start) & (pos < test_end) & (step > 0)
+        folds.append((np.flatnonzero(train), np.flatnonzero(test)))
+    return folds
+
+
+def _fit_predict_xgboost(X_train, y_train, X_test, n_classes):
+    from xgboost import XGBClassifier
+
+    model = XGBClassifier(objective='multi:softprob', num_class=n_classes, eval_metric='mlogloss',
+                          tree_method='hist', random_state=SEED, n_jobs=1)
+    model.fit(X_train, y_train)
+    return model.predict(X_test)
+
+
+def _fit_predict_logreg(X_train, y_train, X_test, n_classes):
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(solver='sag', penalty='l2', max_iter=2000, random_state=SEED)
+    model.fit(X_train, y_train)
+    return model.predict(X_test)
+
+
+def _fit_predict_mlp(X_train, y_train, X_test, n_classes, epochs=10, batch_size=64):
+    # same network and training loop as neural_network.ipynb
+    import torch
+    from sklearn.preprocessing import StandardScaler
+    from nn_inference import MLP
+
+    torch.manual_seed(SEED)
+    torch.set_num_threads(1)
+    scaler = StandardScaler().fit(X_train)
+    X = torch.from_numpy(scaler.transform(X_train)).float()
+    y = torch.from_numpy(np.asarray(y_train, dtype=np.int64))
+    model = MLP(X.shape[1], 128, n_classes)
+    criterion = torch.nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    for _ in range(epochs):
+        model.train()
+        for idx in torch.randperm(len(y)).split(batch_size):
+            loss = criterion(model(X[idx]), y[idx])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+    model.eval()
+    with torch.inference_mode():
+        logits = model(torch.from_numpy(scaler.transform(X_test)).float())
+    return logits.argmax(dim=1).numpy()
+
+
+FIT_PREDICT = {
+    'xgboost': _fit_predict_xgboost,
+    'logreg': _fit_predict_logreg,
+    'mlp': _fit_predict_mlp,
+}
+
+
+def _run_task(task):
+    path, model_name, fold, fold_args = task
+    data = load_features(path)
+    train_idx, test_idx = walk_forward_folds(data['stock'], **fold_args)[fold]
+    n_classes = len(data['meta']['classes'])
+    # fancy indexing copies just the fold's rows out of the memory map
+    X_train, y_train = data['X'][train_idx], data['y'][train_idx]
+    X_test, y_test = data['X'][test_idx], data['y'][test_idx]
+
+    start = time.perf_counter()
+    pred = FIT_PREDICT[model_name](X_train, y_train, X_test, n_classes)
+    return {
+        'model': model_name,
+        'fold': fold,
+        'n_train': len(train_idx),
+        'n_test': len(test_idx),
+        'accuracy': accuracy_score(y_test, pred),
+        'macro_f1': f1_score(y_test, pred, average='macro', labels=np.arange(n_classes), zero_division=0),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def run_walk_forward(config, models=MODELS, n_folds=4, min_train=0.5, window=None, max_workers=None):
+    """Train and score every model on every fold in parallel; one row per (model, fold)."""
+    path = build_features(config)
+    fold_args = {'n_folds': n_folds, 'min_train': min_train, 'window': window}
+    tasks = [(path, model, fold, fold_args) for model in models for fold in range(n_folds)]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_run_task, tasks))
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Walk-forward evaluation of the label classifiers.')
+    parser.add_argument('--source', default='training_data.csv')
+    parser.add_argument('--target', choices=LABELS, default='label_3')
+    parser.add_argument('--models', nargs='+', choices=MODELS, default=MODELS)
+    parser.add_argument('--folds', type=int, default=4)
+    parser.add_argument('--min-train', type=float, default=0.5)
+    parser.add_argument('--window', type=int, default=None, help='rolling training window (rows per ticker)')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.source):
+        raise SystemExit(f"Error: '{args.source}' not found. Place it alongside this script.")
+
+    results = run_walk_forward(feature_config(args.source, args.target), args.models,
+                               args.folds, args.min_train, args.window, args.workers)
+    out_file = f'walk_forward_{args.target}.csv'
+    results.to_csv(out_file, index=False)
+    print(results.to_string(index=False))
+    print()
+    print(results.groupby('model')[['accuracy', 'macro_f1', 'seconds']].mean().to_string())
+    print(f"→ Wrote fold results to '{out_file}'")
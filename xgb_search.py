@@ -0,0 +1,226 @@
+# Hyperparameter search for the XGBoost label_3 / label_7 models by successive
+# halving, in place of cs175_XGBoost.ipynb's exhaustive GridSearchCV.
+#
+# Every candidate starts with min_rounds boosting rounds; after each rung only the
+# best 1/eta (by validation mlogloss) continue, with eta times the rounds, until
+# max_rounds. A surviving booster keeps training from where it stopped instead of
+# starting over, and each rung also stops early once validation mlogloss stalls.
+#
+# Data is the cached feature matrix from walk_forward.py, split per ticker in time
+# order like the notebooks (70% train / 15% validation / 15% test). Each worker
+# process builds the training QuantileDMatrix (hist) and the validation DMatrix
+# once, in the pool initializer, and reuses them for every trial it runs.
+#
+# Usage:
+#   python xgb_search.py --target label_3                  # notebook grid
+#   python xgb_search.py --target label_7 --trials 200     # random search, Optuna ranges
+#   python xgb_search.py --min-rounds 100 --max-rounds 100  # exhaustive, for comparison
+
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score
+
+from walk_forward import LABELS, SEED, build_features, feature_config, load_features, walk_forward_folds
+
+# notebook grid; n_estimators is the round budget (max_rounds) rather than a grid axis
+PARAM_GRID = {
+    'max_depth': [3, 5],
+    'learning_rate': [0.1, 0.3],
+    'subsample': [0.8, 1.0],
+}
+# Optuna ranges from the notebook, for random search
+PARAM_RANGES = {
+    'max_depth': (3, 10),
+    'learning_rate': (0.01, 0.3),
+    'subsample': (0.6, 1.0),
+}
+EARLY_STOPPING_ROUNDS = 10
+
+# set in each worker by _init_worker
+_data = None
+
+
+def grid_candidates(grid=PARAM_GRID):
+    """Every combination of the grid, as a list of parameter dicts."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+def random_candidates(n_trials, ranges=PARAM_RANGES, seed=SEED):
+    """n_trials parameter dicts drawn from ranges (learning rate log-uniform)."""
+    rng = np.random.default_rng(seed)
+    low, high = ranges['learning_rate']
+    return [
+        {
+            'max_depth': int(rng.integers(ranges['max_depth'][0], ranges['max_depth'][1] + 1)),
+            'learning_rate': float(np.exp(rng.uniform(np.log(low), np.log(high)))),
+            'subsample': float(rng.uniform(*ranges['subsample'])),
+        }
+        for _ in range(n_trials)
+    ]
+
+
+def search_splits(stock_codes):
+    """(train, validation, test) row indices: 70/15/15 per ticker, in time order."""
+    (train, val), (_, test) = walk_forward_folds(stock_codes, n_folds=2, min_train=0.70)
+    return train, val, test
+
+
+def _init_worker(path, balanced):
+    # build the DMatrix pair once per worker; every trial reuses it
+    global _data
+    import xgboost as xgb
+
+    data = load_features(path)
+    train, val, _ = search_splits(data['stock'])
+    y_train = np.asarray(data['y'][train])
+    weight = None
+    if balanced:
+        # inverse class frequency, as in the notebook's weighted model
+        counts = np.bincount(y_train)
+        weight = (len(y_train) / (len(counts) * counts))[y_train]
+    dtrain = xgb.QuantileDMatrix(data['X'][train], label=y_train, weight=weight)
+    y_val = np.asarray(data['y'][val])
+    dval = xgb.DMatrix(data['X'][val], label=y_val)
+    _data = {'dtrain': dtrain, 'dval': dval, 'y_val': y_val, 'n_classes': len(data['meta']['classes'])}
+
+
+def _booster_params(params, n_classes):
+    return {**params, 'objective': 'multi:softprob', 'num_class': n_classes, 'eval_metric': 'mlogloss',
+            'tree_method': 'hist', 'seed': SEED, 'nthread': 1}
+
+
+def _run_trial(task):
+    import xgboost as xgb
+
+    trial, params, rounds, model = task
+    start = time.perf_counter()
+    booster = None
+    if model is not None:
+        booster = xgb.Booster()
+        booster.load_model(bytearray(model))
+    done = booster.num_boosted_rounds() if booster is not None else 0
+
+    booster = xgb.train(_booster_params(params, _data['n_classes']), _data['dtrain'],
+                        num_boost_round=rounds - done, xgb_model=booster, evals=[(_data['dval'], 'val')],
+                        early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+    best = booster.best_iteration
+    proba = booster.predict(_data['dval'], iteration_range=(0, best + 1))
+    return {
+        'trial': trial,
+        **params,
+        'rounds': booster.num_boosted_rounds(),
+        'best_iteration': best,
+        'val_mlogloss': float(booster.best_score),
+        'val_macro_f1': f1_score(_data['y_val'], proba.argmax(axis=1), average='macro'),
+        'stopped_early': booster.num_boosted_rounds() < rounds,
+        'seconds': time.perf_counter() - start,
+        'model': bytes(booster.save_raw('ubj')),
+    }
+
+
+def successive_halving(path, candidates, min_rounds=25, max_rounds=100, eta=3, balanced=False,
+                       max_workers=None):
+    """Successive-halving search over candidates.
+
+    Args:
+        path (str): feature cache directory from walk_forward.build_features.
+        candidates (list): parameter dicts (max_depth, learning_rate, subsample, ...).
+        min_rounds (int): boosting rounds in the first rung.
+        max_rounds (int): rounds of the final rung; min_rounds == max_rounds trains every
+            candidate to the full budget (no halving).
+        eta (int): keep the best 1/eta of the candidates after every rung.
+        balanced (bool): inverse class frequency sample weights.
+        max_workers (int): worker processes; None uses os.cpu_count().
+
+    Returns:
+        (pd.DataFrame, dict): one row per trial run (rung, timing, validation scores),
+        and the best final trial including its serialized booster under 'model'.
+    """
+    rounds = min(min_rounds, max_rounds)
+    tasks = [(trial, params, rounds, None) for trial, params in enumerate(candidates)]
+    log, finished, previous = [], [], {}
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(path, balanced)) as pool:
+        for rung in itertools.count():
+            results = list(pool.map(_run_trial, tasks))
+            log.extend({'rung': rung, **{k: v for k, v in r.items() if k != 'model'}} for r in results)
+            # early stopping in a continued run only sees its own new rounds; when they
+            # never beat the previous rung, keep that rung's booster and score
+            results = [
+                {**previous[r['trial']], 'stopped_early': True}
+                if r['trial'] in previous and previous[r['trial']]['val_mlogloss'] < r['val_mlogloss'] else r
+                for r in results
+            ]
+            if rounds >= max_rounds:
+                finished.extend(results)
+                break
+            results.sort(key=lambda r: r['val_mlogloss'])
+            survivors = results[:max(1, len(results) // eta)]
+            # an early-stopped booster would not improve with more rounds: it stays in
+            # the final ranking but is not trained again
+            finished.extend(r for r in survivors if r['stopped_early'])
+            previous = {r['trial']: r for r in survivors}
+            rounds = min(rounds * eta, max_rounds)
+            tasks = [(r['trial'], candidates[r['trial']], rounds, r['model'])
+                     for r in survivors if not r['stopped_early']]
+            if not tasks:
+                break
+
+    best = min(finished, key=lambda r: r['val_mlogloss'])
+    return pd.DataFrame(log), best
+
+
+def test_macro_f1(path, best):
+    """Macro-F1 of the best trial's booster on the held-out test split."""
+    import xgboost as xgb
+
+    data = load_features(path)
+    _, _, test = search_splits(data['stock'])
+    booster = xgb.Booster()
+    booster.load_model(bytearray(best['model']))
+    proba = booster.predict(xgb.DMatrix(data['X'][test]), iteration_range=(0, best['best_iteration'] + 1))
+    return f1_score(np.asarray(data['y'][test]), proba.argmax(axis=1), average='macro')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Successive-halving XGBoost hyperparameter search.')
+    parser.add_argument('--source', default='training_data.csv')
+    parser.add_argument('--target', choices=LABELS, default='label_3')
+    parser.add_argument('--trials', type=int, default=None, help='random candidates instead of the notebook grid')
+    parser.add_argument('--min-rounds', type=int, default=25)
+    parser.add_argument('--max-rounds', type=int, default=100)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--balanced', action='store_true', help='inverse class frequency sample weights')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.source):
+        raise SystemExit(f"Error: '{args.source}' not found. Place it alongside this script.")
+
+    # the XGBoost notebook trains without stock_id
+    path = build_features(feature_config(args.source, args.target, stock_id=False))
+    candidates = random_candidates(args.trials) if args.trials else grid_candidates()
+
+    start = time.perf_counter()
+    log, best = successive_halving(path, candidates, args.min_rounds, args.max_rounds, args.eta,
+                                   args.balanced, args.workers)
+    wall = time.perf_counter() - start
+
+    out_file = f'xgb_search_{args.target}.csv'
+    log.to_csv(out_file, index=False)
+    print(log.to_string(index=False))
+    print()
+    params = {k: best[k] for k in PARAM_RANGES}
+    print(f"Best trial {best['trial']}: {params}, {best['best_iteration'] + 1} rounds, "
+          f"val mlogloss {best['val_mlogloss']:.4f}, val macro-F1 {best['val_macro_f1']:.4f}, "
+          f"test macro-F1 {test_macro_f1(path, best):.4f}")
+    print(f"{len(candidates)} candidates, {len(log)} trial runs, {log['seconds'].sum():.1f}s of training, "
+          f"{wall:.1f}s wall")
+    print(f"→ Wrote trial log to '{out_file}'")